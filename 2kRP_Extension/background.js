@@ -1,4 +1,14 @@
 const SERVER_URL = 'http://localhost:7789';
+const DATA_FIELDS = ['gameType', 'location', 'badgeImageUrl', 'playersOnline', 'playersOnMap', 'wikiPageUrl'];
+// Unchanged tabs still send an empty update this often, well within the server's SOURCE_TIMEOUT,
+// so a focused tab where the player stands still keeps driving the presence
+const KEEPALIVE_INTERVAL_MS = 10000;
+
+let eventSource = null;
+let channelOpen = false;
+// Channel state of every tab sending data: clientId -> { lastSent, sentAt, seq }
+const clients = new Map();
+let delivery = Promise.resolve();
 
 async function checkServerStatus(url) {
     try {
@@ -29,21 +39,146 @@ async function sendDataToServer(data) {
     }
 }
 
-chrome.runtime.onMessage.addListener(async (message, sender, sendResponse) => {
+/**
+ * Opens the event stream used to learn about the server state and receive acknowledgements
+ */
+function openChannel() {
+    if (eventSource) {
+        return;
+    }
+
+    eventSource = new EventSource(`${SERVER_URL}/events`);
+    eventSource.addEventListener('hello', () => {
+        // A new connection may be a restarted server, so the next update of every tab carries the full state
+        channelOpen = true;
+        for (const client of clients.values()) {
+            client.lastSent = null;
+        }
+    });
+    eventSource.addEventListener('ack', (event) => {
+        console.log('Update acknowledged:', JSON.parse(event.data));
+    });
+    eventSource.addEventListener('presence', (event) => {
+        console.log('Presence updated:', JSON.parse(event.data));
+    });
+    eventSource.onerror = () => {
+        // EventSource reconnects on its own, fall back to plain requests meanwhile
+        channelOpen = false;
+    };
+}
+
+/**
+ * Returns the channel state of a tab, creating it on first use
+ * @param {string} clientId
+ * @returns {{lastSent: object|null, sentAt: number, seq: number}}
+ */
+function getClient(clientId) {
+    let client = clients.get(clientId);
+    if (!client) {
+        client = { lastSent: null, sentAt: 0, seq: 0 };
+        clients.set(clientId, client);
+    }
+    return client;
+}
+
+/**
+ * Returns the fields of data that differ from the last sent state
+ * @param {object|null} lastSent
+ * @param {object} data
+ * @returns {object}
+ */
+function getChangedFields(lastSent, data) {
+    const changes = {};
+    for (const field of DATA_FIELDS) {
+        if (!lastSent || lastSent[field] !== data[field]) {
+            changes[field] = data[field];
+        }
+    }
+    return changes;
+}
+
+/**
+ * Sends only the changed fields over the channel, resending the full state when the server asks for it
+ * @param {string} clientId
+ * @param {object} data
+ * @returns {Promise<boolean>} false if the channel endpoint could not be used
+ */
+async function sendUpdate(clientId, data) {
+    const client = getClient(clientId);
+    const full = client.lastSent === null;
+    const changes = getChangedFields(client.lastSent, data);
+    const unchanged = !full && Object.keys(changes).length === 0 && client.lastSent.focused === data.focused;
+    if (unchanged && Date.now() - client.sentAt < KEEPALIVE_INTERVAL_MS) {
+        return true;
+    }
+
+    client.seq += 1;
+    const seq = client.seq;
+    const response = await fetch(`${SERVER_URL}/update`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ seq, full, changes, clientId, focused: data.focused }),
+    });
+    if (!response.ok) {
+        return false;
+    }
+
+    const result = await response.json();
+    if (result.status === 'resync') {
+        client.lastSent = null;
+        return sendUpdate(clientId, data);
+    }
+
+    client.lastSent = data;
+    client.sentAt = Date.now();
+    return true;
+}
+
+/**
+ * Delivers the collected data, preferring the channel over full POST requests
+ * @param {string} clientId
+ * @param {object} data
+ */
+async function deliverData(clientId, data) {
+    openChannel();
+    if (channelOpen) {
+        try {
+            if (await sendUpdate(clientId, data)) {
+                return;
+            }
+        } catch (error) {
+            console.error('Error sending update:', error);
+        }
+        getClient(clientId).lastSent = null;
+    }
+
+    // Fallback for servers without the channel endpoints
+    const isServerActive = await checkServerStatus(`${SERVER_URL}/status`);
+
+    if (isServerActive) {
+        await sendDataToServer({ ...data, clientId });
+    } else {
+        console.error('Server is not active');
+    }
+}
+
+chrome.runtime.onMessage.addListener((message, sender, sendResponse) => {
     if (message.type === '2KKI_DATA') {
-        const isServerActive = await checkServerStatus(`${SERVER_URL}/status`);
-
-        if (isServerActive) {
-            await sendDataToServer({
-                gameType: message.gameType,
-                location: message.location,
-                badgeImageUrl: message.badgeImageUrl,
-                playersOnline: message.playersOnline,
-                playersOnMap: message.playersOnMap,
-                wikiPageUrl: message.wikiPageUrl
-            });
-        } else {
-            console.error('Server is not active');
+        const data = { focused: message.focused };
+        for (const field of DATA_FIELDS) {
+            data[field] = message[field];
         }
+
+        // Every tab is its own source, the server picks the one the player is looking at
+        const clientId = sender.tab ? `tab-${sender.tab.id}` : 'default';
+
+        // Deliver one message at a time so sequence numbers reach the server in order
+        delivery = delivery.then(() => deliverData(clientId, data));
     }
 });
+
+chrome.tabs.onRemoved.addListener((tabId) => {
+    clients.delete(`tab-${tabId}`);
+});
@@ -1,4 +1,5 @@
 let intervalId = null;
+let locationObserver = null;
 
 /**
  * Extracts the first number found in a string
@@ -59,6 +60,14 @@ function getBackgroundImageUrl(element) {
   return urlMatch ? urlMatch[1] : null;
 }
 
+/**
+ * Tells whether the player is looking at this tab, so the server can prefer it over other open games
+ * @returns {boolean}
+ */
+function isFocused() {
+  return document.visibilityState === "visible" && document.hasFocus();
+}
+
 /**
  * Sends all collected data to the background script
  */
@@ -89,16 +98,41 @@ function sendAllData() {
       playersOnline,
       playersOnMap,
       wikiPageUrl,
+      focused: isFocused(),
     });
   });
 }
 
+/**
+ * Sends the data shortly after the location text changes, so room changes do not wait for the next interval
+ */
+function observeLocation() {
+  const spanElement = document.getElementById("locationText");
+  if (!spanElement || locationObserver) {
+    return;
+  }
+
+  let pending = null;
+  locationObserver = new MutationObserver(() => {
+    clearTimeout(pending);
+    pending = setTimeout(sendAllData, 250);
+  });
+  locationObserver.observe(spanElement, { childList: true, subtree: true, characterData: true });
+}
+
 /**
  * Starts the data collection at regular intervals
  */
 function startCollecting() {
   if (!intervalId) {
-    intervalId = setInterval(sendAllData, 5000);
+    intervalId = setInterval(() => {
+      observeLocation();
+      sendAllData();
+    }, 5000);
+    observeLocation();
+    window.addEventListener("focus", sendAllData);
+    window.addEventListener("blur", sendAllData);
+    document.addEventListener("visibilitychange", sendAllData);
   }
 }
 
@@ -110,6 +144,13 @@ function stopCollecting() {
     clearInterval(intervalId);
     intervalId = null;
   }
+  if (locationObserver) {
+    locationObserver.disconnect();
+    locationObserver = null;
+  }
+  window.removeEventListener("focus", sendAllData);
+  window.removeEventListener("blur", sendAllData);
+  document.removeEventListener("visibilitychange", sendAllData);
 }
 
 // Listens for messages to toggle the extension's data collection
@@ -1,13 +1,20 @@
+# Imported first so the startup report covers every other import
+from utils.startup import startup_timer
+import argparse
 import logging
+import signal
 import threading
 import sys
-from PySide6.QtWidgets import QApplication
-from interface.qtui import MainWindow
-from server.server import create_app
-from werkzeug.serving import make_server
-from presence.presence import run_presence
+from server.async_server import AsyncServerThread
+from server.recorder import payload_recorder
+from presence.presence import run_presence, set_image_budget, wake_presence
 from utils.utils import get_translated_string
-from app_context import set_main_window
+from utils.translations import translator
+from utils.constants import SERVER_BACKENDS, SERVER_HOST, SERVER_PORT
+from utils.memory import memory_diagnostics
+from shared.data import subscribe
+from shared.session_log import session_log
+from shared.settings import open_settings, publish_presence_settings, read_presence_settings, write_default_presence_settings
 
 # Configure logging
 log = logging.getLogger('werkzeug')
@@ -18,9 +25,12 @@ stop_flag = threading.Event()
 
 class FlaskThread(threading.Thread):
     """Thread to run the Flask server."""
-    def __init__(self):
+    def __init__(self, host: str = SERVER_HOST, port: int = SERVER_PORT):
+        from werkzeug.serving import make_server
+        from server.server import create_app
+
         super().__init__()
-        self.server = make_server('0.0.0.0', 7789, create_app())
+        self.server = make_server(host, port, create_app(), threaded=True)
         self.context = self.server.app.app_context()
         self.context.push()
 
@@ -32,36 +42,116 @@ class FlaskThread(threading.Thread):
         print(get_translated_string('flask_end'))
         self.server.shutdown()
 
+class LocalServerThread(AsyncServerThread):
+    """Thread to run the asyncio server."""
+    def __init__(self, host: str = SERVER_HOST, port: int = SERVER_PORT):
+        super().__init__(host, port)
+
+    def run(self):
+        print(get_translated_string('server_start'))
+        super().run()
+
+    def shutdown(self):
+        print(get_translated_string('server_end'))
+        super().shutdown()
+
+def create_server_thread(backend: str):
+    """Creates the thread running the selected server backend."""
+    if backend == 'flask':
+        return FlaskThread()
+    return LocalServerThread()
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='2kRP Presence Controller')
+    parser.add_argument('--server', choices=SERVER_BACKENDS, default=SERVER_BACKENDS[0], help='local server backend')
+    parser.add_argument('--headless', action='store_true', help='run only the server and the presence loop, without the window')
+    parser.add_argument('--image-budget', type=int, metavar='MS', help='how long a presence update may wait for the room image')
+    parser.add_argument('--record-payloads', metavar='FILE', help='append the payloads received from the extension to FILE, for benchmarks.replay')
+    parser.add_argument('--low-memory', action='store_true', help='build rarely used tabs on demand and release caches while the game is idle')
+    parser.add_argument('--startup-report', action='store_true', help='print how long each startup phase took')
+    return parser.parse_known_args()
+
 def greet_user():
     print(get_translated_string('greeting'))
 
-if __name__ == '__main__':
-    # Initialize the Qt application.
-    app = QApplication(sys.argv)
-    window = MainWindow()
+def load_headless_settings():
+    """Loads the presence settings without creating any Qt widgets."""
+    settings = open_settings()
+    write_default_presence_settings(settings)
+    publish_presence_settings(read_presence_settings(settings))
+
+def create_window(qt_args, lazy_tabs: bool = False):
+    """Creates the Qt application and the settings window."""
+    from PySide6.QtWidgets import QApplication
+    from interface.qtui import MainWindow
+    from app_context import set_main_window
+    startup_timer.mark('gui_imports')
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    startup_timer.mark('qt_application')
+    window = MainWindow(lazy_tabs=lazy_tabs)
     set_main_window(window)
     if not window.settings.value('start_minimized', True, type=bool):
         window.show()
         window.activateWindow()
     else:
         window.close()
+    return app
+
+def wait_headless() -> int:
+    """Blocks until the process is interrupted or terminated."""
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_flag.set())
+    try:
+        # Short waits keep Ctrl+C responsive on Windows
+        while not stop_flag.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    startup_timer.mark('imports')
+    args, qt_args = parse_arguments()
+    startup_timer.enabled = args.startup_report
+    if args.image_budget is not None:
+        set_image_budget(args.image_budget / 1000)
+    if args.record_payloads:
+        payload_recorder.start(args.record_payloads)
+    
+    if args.headless:
+        load_headless_settings()
+        startup_timer.mark('settings')
+    else:
+        # Initialize the Qt application.
+        app = create_window(qt_args, lazy_tabs=args.low_memory)
+        startup_timer.mark('window')
         
     greet_user()
+    translator.start_watching()
+    session_log.start()
+    if args.low_memory:
+        subscribe(memory_diagnostics.notify_activity)
+        memory_diagnostics.start_idle_release(stop_flag)
         
-    # Run the Flask app in a separate thread
-    flask_thread = FlaskThread()
-    flask_thread.start()
+    # Run the local server in a separate thread
+    server_thread = create_server_thread(args.server)
+    server_thread.start()
 
     # Run the presence update loop in a separate thread
     presence_thread = threading.Thread(target=run_presence, args=(stop_flag,))
     presence_thread.start()
+    startup_timer.mark('threads')
     
-    exit_code = app.exec()
+    exit_code = wait_headless() if args.headless else app.exec()
 
-    # Wait for the Qt application to finish
+    # Wait for the Qt application or the headless wait to finish
     stop_flag.set()
-    flask_thread.shutdown()
-    flask_thread.join()
+    wake_presence()
+    server_thread.shutdown()
+    server_thread.join()
     presence_thread.join()
+    session_log.close()
+    payload_recorder.close()
+    startup_timer.finish('shutdown')
     
     sys.exit(exit_code)
\ No newline at end of file
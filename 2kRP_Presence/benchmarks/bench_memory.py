@@ -0,0 +1,139 @@
+"""
+Measures the resident memory of the app in its different modes.
+
+Each mode starts app.py in a fresh interpreter (Qt on the offscreen platform), waits until
+the local server answers, lets it settle, then reads its resident memory, posts a burst of
+extension payloads and reads it again. The 'release' section resolves the fixture wiki
+pages in this process and reports the memory handed back by the low-memory releasers.
+
+Resident memory of other processes is read from /proc, so the app modes only run on Linux.
+
+Usage (from the 2kRP_Presence directory):
+    python -m benchmarks.bench_memory [--settle S] [--payloads N] [--modes headless gui ...]
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from utils.constants import SERVER_HOST, SERVER_PORT
+from utils.memory import read_rss_kib
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = {
+    'headless': ['--headless'],
+    'headless-low-memory': ['--headless', '--low-memory'],
+    'gui': [],
+    'gui-low-memory': ['--low-memory'],
+}
+STARTUP_TIMEOUT = 30
+
+def read_process_rss_kib(pid: int) -> int:
+    """Returns the resident set size of another process in KiB, from /proc."""
+    with open(f"/proc/{pid}/status", 'r', encoding='utf-8') as file:
+        for line in file:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+def request(method: str, path: str, body: dict = None):
+    connection = http.client.HTTPConnection(SERVER_HOST, SERVER_PORT, timeout=2)
+    try:
+        connection.request(method, path, json.dumps(body) if body is not None else None, {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+def wait_for_server(process) -> bool:
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            if request('GET', '/status') == 200:
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+def measure_mode(flags: list, settle: float, payloads: int) -> dict:
+    """Runs app.py with the given flags and samples its memory after startup and after a burst of payloads."""
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get('QT_QPA_PLATFORM', 'offscreen'))
+    process = subprocess.Popen(
+        [sys.executable, 'app.py', *flags], cwd=APP_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_for_server(process):
+            raise RuntimeError(f"app.py {' '.join(flags)} did not start")
+        time.sleep(settle)
+        startup = read_process_rss_kib(process.pid)
+
+        for index in range(payloads):
+            request('POST', '/receive_from_2kki', {
+                'gameType': '2kki',
+                'location': f"Room {index % 50}",
+                'badgeImageUrl': None,
+                'playersOnline': 100 + index % 30,
+                'playersOnMap': index % 5,
+                'wikiPageUrl': None
+            })
+        time.sleep(settle)
+        return {'startup_rss_kib': startup, 'traffic_rss_kib': read_process_rss_kib(process.pid)}
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+def measure_release(rounds: int) -> dict:
+    """Resolves the fixture pages without the image cache, then runs the low-memory releasers."""
+    from benchmarks.fixture_server import FixtureServer
+    from utils import utils
+    from utils.image_cache import ImageCache
+    from utils.memory import memory_diagnostics
+
+    server = FixtureServer().start()
+    directory = tempfile.TemporaryDirectory()
+    original_cache = utils.image_cache
+    utils.image_cache = cache = ImageCache(os.path.join(directory.name, 'wiki_images.json'))
+    try:
+        before = read_rss_kib()
+        for _ in range(rounds):
+            cache.clear()
+            for page in server.pages:
+                utils.get_wiki_image(server.url(page))
+        loaded = read_rss_kib()
+        memory_diagnostics.release_memory()
+        return {'before_kib': before, 'loaded_kib': loaded, 'released_kib': read_rss_kib()}
+    finally:
+        utils.image_cache = original_cache
+        server.stop()
+        directory.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures the resident memory of the app in its different modes.')
+    parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=list(MODES))
+    parser.add_argument('--settle', type=float, default=3, help='seconds to wait before each sample')
+    parser.add_argument('--payloads', type=int, default=500, help='payloads posted between the two samples')
+    parser.add_argument('--rounds', type=int, default=50, help='fetches of every fixture page before releasing')
+    args = parser.parse_args()
+
+    if sys.platform.startswith('linux'):
+        print(f"{'mode':<22}{'startup MiB':>12}{'traffic MiB':>12}")
+        for mode in args.modes:
+            result = measure_mode(MODES[mode], args.settle, args.payloads)
+            print(f"{mode:<22}{result['startup_rss_kib'] / 1024:>12.1f}{result['traffic_rss_kib'] / 1024:>12.1f}")
+    else:
+        print("App modes skipped: reading the memory of another process needs /proc")
+
+    result = measure_release(args.rounds)
+    print(f"\nrelease: {result['before_kib'] / 1024:.1f} MiB before, {result['loaded_kib'] / 1024:.1f} MiB after fetching, {result['released_kib'] / 1024:.1f} MiB after releasing")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Compares the asyncio server backend against the Flask/werkzeug one.
+
+Each backend is started in a fresh interpreter, which reports how long importing and
+starting it took and its resident memory once listening. Requests/sec is then measured
+with a few keep-alive clients posting extension payloads to '/receive_from_2kki'.
+
+Usage (from the 2kRP_Presence directory):
+    python -m benchmarks.bench_server [--seconds S] [--clients N]
+"""
+import argparse
+import http.client
+import json
+import subprocess
+import sys
+import threading
+import time
+from utils.memory import read_rss_kib
+
+PAYLOAD = json.dumps({
+    'gameType': '2kki',
+    'location': 'Urban Street',
+    'badgeImageUrl': None,
+    'playersOnline': 120,
+    'playersOnMap': 3,
+    'wikiPageUrl': 'https://yume.wiki/2kki/Urban_Street'
+})
+
+def serve(backend: str):
+    """Runs one backend on an ephemeral port and reports its startup figures on stdout."""
+    start = time.perf_counter()
+    if backend == 'flask':
+        from werkzeug.serving import make_server
+        from server.server import create_app
+        server = make_server('127.0.0.1', 0, create_app(), threaded=True)
+        port = server.server_port
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+    else:
+        from server.async_server import AsyncServerThread
+        thread = AsyncServerThread('127.0.0.1', 0)
+        thread.daemon = True
+        thread.start()
+        thread.ready.wait()
+        port = thread.server.port
+    startup = time.perf_counter() - start
+
+    print(json.dumps({'port': port, 'startup_ms': startup * 1000, 'rss_kib': read_rss_kib()}), flush=True)
+    sys.stdin.read()
+
+def hammer(port: int, seconds: float, counts: list, index: int):
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    headers = {'Content-Type': 'application/json'}
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        connection.request('POST', '/receive_from_2kki', body=PAYLOAD, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        if response.status == 200:
+            counts[index] += 1
+    connection.close()
+
+def benchmark(backend: str, seconds: float, clients: int) -> dict:
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.bench_server', '--serve', backend],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    try:
+        result = json.loads(process.stdout.readline())
+        counts = [0] * clients
+        threads = [threading.Thread(target=hammer, args=(result['port'], seconds, counts, i)) for i in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        result['requests_per_sec'] = sum(counts) / seconds
+        return result
+    finally:
+        process.stdin.close()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=3, help='load duration per backend')
+    parser.add_argument('--clients', type=int, default=4, help='concurrent keep-alive clients')
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    print(f"{'backend':<10}{'startup ms':>12}{'RSS KiB':>10}{'req/s':>10}")
+    for backend in ('asyncio', 'flask'):
+        result = benchmark(backend, args.seconds, args.clients)
+        print(f"{backend:<10}{result['startup_ms']:>12.1f}{result['rss_kib']:>10}{result['requests_per_sec']:>10.0f}")
+
+if __name__ == '__main__':
+    main()
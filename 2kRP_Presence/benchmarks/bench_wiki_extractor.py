@@ -0,0 +1,77 @@
+"""
+Compares the streaming wiki image extractor against the BeautifulSoup selector chain.
+
+Both paths are run over the saved pages in benchmarks/fixtures, checking that they agree
+and reporting the median parse time and the peak traced memory of each.
+
+Usage (from the 2kRP_Presence directory):
+    python -m benchmarks.bench_wiki_extractor [--runs N]
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+import tracemalloc
+from bs4 import BeautifulSoup
+from utils.utils import extract_image_url
+from utils.wiki_extractor import extract_image_url_from_chunks
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+CHUNK_SIZE = 16 * 1024
+
+def load_fixtures():
+    """Returns (name, content) pairs for every saved wiki page."""
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.html'))):
+        with open(path, 'rb') as file:
+            fixtures.append((os.path.basename(path), file.read()))
+    return fixtures
+
+def soup_path(content: bytes):
+    return extract_image_url(BeautifulSoup(content, 'html.parser'))
+
+def streaming_path(content: bytes):
+    chunks = (content[i:i + CHUNK_SIZE] for i in range(0, len(content), CHUNK_SIZE))
+    return extract_image_url_from_chunks(chunks)
+
+def measure(function, content: bytes, runs: int):
+    """Returns (result, median seconds, peak bytes) for the given extraction path."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function(content)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, statistics.median(timings), peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20, help='timed runs per page and path')
+    args = parser.parse_args()
+
+    print(f"{'page':<24}{'size':>9}{'soup ms':>10}{'stream ms':>11}{'speedup':>9}{'soup KiB':>10}{'stream KiB':>12}")
+    mismatches = 0
+    for name, content in load_fixtures():
+        soup_result, soup_time, soup_peak = measure(soup_path, content, args.runs)
+        stream_result, stream_time, stream_peak = measure(streaming_path, content, args.runs)
+
+        if soup_result != stream_result:
+            mismatches += 1
+            print(f"MISMATCH in {name}: {soup_result!r} != {stream_result!r}")
+
+        print(
+            f"{name:<24}{len(content):>9}{soup_time * 1000:>10.2f}{stream_time * 1000:>11.2f}"
+            f"{soup_time / stream_time:>8.1f}x{soup_peak / 1024:>10.0f}{stream_peak / 1024:>12.0f}"
+        )
+
+    if mismatches:
+        raise SystemExit(f"{mismatches} page(s) resolved to a different image")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Local stand-in for yume.wiki serving the saved pages in benchmarks/fixtures.
+
+'/2kki/<page>' answers with benchmarks/fixtures/<page>.html and a strong ETag derived from
+its content, and with '304 Not Modified' when the request carries that ETag, so the
+benchmarks can exercise the full fetch and revalidation paths without network access.
+
+'/2kki/api.php' stands in for the MediaWiki API: action=query with prop=pageimages (and
+links) over the same pages, following MediaWiki in normalizing titles, reporting unknown
+ones as missing and redirecting titles that only differ in case, as the wiki does. Like
+MediaWiki, prop=links lists every article link of the pages in alphabetical order, cut at
+pllimit with a 'continue' marker, rather than the room connections of the infobox.
+"""
+import glob
+import hashlib
+import http.server
+import json
+import os
+import re
+import threading
+from urllib.parse import parse_qs, unquote, urlsplit
+from utils.image_index import read_page_metadata
+from utils.wiki_extractor import extract_page_data_from_chunks
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FIXTURE_WIKI = '2kki'
+# Titles a single API request may ask about, as on MediaWiki for clients without the apihighlimits right
+API_TITLES_LIMIT = 50
+PAGE_LINK_PATTERN = re.compile(rb'href="/' + FIXTURE_WIKI.encode() + rb'/([^"#?]+)"')
+
+class FixtureRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; Nagle would hold the body for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.server.requests += 1
+        parts = urlsplit(self.path)
+        if parts.path.endswith('/api.php') and self.server.api:
+            self.server.api_requests += 1
+            self.send_json(self.server.query(parse_qs(parts.query)))
+            return
+
+        page = self.server.pages.get(parts.path.rstrip('/').rsplit('/', 1)[-1].lower())
+        if page is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        content, etag = page
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=UTF-8')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def send_json(self, payload: dict):
+        content = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+class FixtureServer(http.server.ThreadingHTTPServer):
+    """Threaded HTTP server for the fixture pages, listening on an ephemeral loopback port."""
+    daemon_threads = True
+
+    def __init__(self, fixtures_dir: str = FIXTURES_DIR, api: bool = True):
+        super().__init__(('127.0.0.1', 0), FixtureRequestHandler)
+        self.api = api
+        self.requests = 0
+        self.api_requests = 0
+        self.pages = {}
+        # Page title -> (image URL, titles of every linked article in alphabetical order), for the API
+        self.titles = {}
+        for path in glob.glob(os.path.join(fixtures_dir, '*.html')):
+            with open(path, 'rb') as file:
+                content = file.read()
+            etag = '"' + hashlib.sha1(content).hexdigest()[:16] + '"'
+            name = os.path.splitext(os.path.basename(path))[0]
+            self.pages[name] = (content, etag)
+
+            title = read_page_metadata(content)[0] or name.replace('_', ' ')
+            image_url, _ = extract_page_data_from_chunks([content])
+            links = {unquote(link.decode('utf-8')).replace('_', ' ') for link in PAGE_LINK_PATTERN.findall(content)}
+            # Namespaced titles, such as files and categories, are not articles
+            self.titles[title] = (image_url, sorted(link for link in links if ':' not in link))
+
+    def url(self, page: str) -> str:
+        """Returns the URL of a fixture page, named after its file without extension."""
+        return f"http://127.0.0.1:{self.server_port}/{FIXTURE_WIKI}/{page}"
+
+    def query(self, params: dict) -> dict:
+        """Answers a MediaWiki API request, in the formatversion=2 layout."""
+        param = lambda name, default='': params.get(name, [default])[0]
+        if param('action') != 'query':
+            return {'error': {'code': 'badvalue', 'info': 'Unrecognized value for parameter "action".'}}
+        titles = [title for title in param('titles').split('|') if title]
+        if len(titles) > API_TITLES_LIMIT:
+            return {'error': {'code': 'toomanyvalues', 'info': f'Too many values supplied for parameter "titles". The limit is {API_TITLES_LIMIT}.'}}
+
+        props = param('prop').split('|')
+        links_limit = int(param('pllimit', '10'))
+        links_left = links_limit
+        continue_from = None
+        by_folded_title = {title.casefold(): title for title in self.titles}
+        query = {'normalized': [], 'redirects': [], 'pages': []}
+        for title in titles:
+            normalized = title.replace('_', ' ').strip()
+            normalized = normalized[:1].upper() + normalized[1:]
+            if normalized != title:
+                query['normalized'].append({'from': title, 'to': normalized})
+            target = by_folded_title.get(normalized.casefold())
+            if target is not None and target != normalized:
+                query['redirects'].append({'from': normalized, 'to': target})
+            if target is None:
+                query['pages'].append({'ns': 0, 'title': normalized, 'missing': True})
+                continue
+
+            image_url, links = self.titles[target]
+            page = {'pageid': len(query['pages']) + 1, 'ns': 0, 'title': target}
+            if 'pageimages' in props and image_url:
+                page['original'] = {'source': image_url, 'width': 640, 'height': 480}
+            if 'links' in props and links:
+                shown = links[:links_left]
+                if shown:
+                    page['links'] = [{'ns': 0, 'title': link} for link in shown]
+                if len(shown) < len(links) and continue_from is None:
+                    continue_from = f"{page['pageid']}|0|{links[len(shown)].replace(' ', '_')}"
+                links_left -= len(shown)
+            query['pages'].append(page)
+
+        result = {'query': {key: value for key, value in query.items() if value}}
+        if continue_from is not None:
+            result['continue'] = {'plcontinue': continue_from, 'continue': '||'}
+        else:
+            result['batchcomplete'] = True
+        return result
+
+    def start(self) -> 'FixtureServer':
+        threading.Thread(target=self.serve_forever, name='fixture-server', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
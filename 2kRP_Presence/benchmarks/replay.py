@@ -0,0 +1,431 @@
+"""
+Replays extension traffic against a local instance of the ingest server.
+
+Payloads recorded with 'app.py --record-payloads FILE', or synthesized here, are sent to a
+fresh server process at the recorded pace, a fixed rate or as fast as possible, from
+several concurrent connections. Every extension client keeps its own connection so its
+sequence numbers arrive in order, and resync requests are answered with the full state
+like the extension does. The server runs the real presence loop against a stub Discord
+client and resolves wiki images from the local fixture server, so everything works offline.
+
+The report covers the latency percentiles, the error rate, the CPU time and resident
+memory of the server process, and whether the final DataStore state matches the state the
+replayed payloads should have produced.
+
+Usage (from the 2kRP_Presence directory):
+    python -m benchmarks.replay synthesize payloads.jsonl [--count N]
+    python -m benchmarks.replay run payloads.jsonl [--rate R | --speed X] [--concurrency N]
+        [--tabs N] [--malformed FRACTION] [--server asyncio|flask] [--output results.json]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from benchmarks.run import percentile
+from utils.memory import read_peak_rss_kib, read_rss_kib
+
+# Seconds to wait for held back states and the presence loop after the last request
+SETTLE_TIMEOUT = 5
+WIKI_ROOMS = ('Urban Street', 'Dark Warehouse', 'Rainbow Towers', 'Unknown Area', 'Missing Room')
+
+class StubPresence:
+    """Stands in for pypresence.Presence, counting the updates instead of talking to Discord."""
+    updates = 0
+    sock_writer = None
+    loop = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def connect(self):
+        pass
+
+    def update(self, **state):
+        StubPresence.updates += 1
+
+    def clear(self):
+        pass
+
+    def close(self):
+        pass
+
+def serve(backend: str):
+    """Runs the server and presence loop with stubbed Discord and wiki, answering 'stats' on stdin."""
+    # stdout carries the replies to the harness, so the application messages go to stderr
+    replies, sys.stdout = sys.stdout, sys.stderr
+    import pypresence
+    pypresence.Presence = StubPresence
+
+    from benchmarks.fixture_server import FixtureServer
+    from shared.session_log import session_log
+    from shared.settings import DEFAULT_PRESENCE_SETTINGS, publish_presence_settings
+    from utils import utils
+    from utils.image_cache import image_cache
+    from presence import prefetcher, resolver
+    from presence.presence import run_presence, wake_presence
+
+    directory = tempfile.TemporaryDirectory()
+    wiki = FixtureServer().start()
+    # Wiki pages are served by the fixture server, and nothing is written to the user cache
+    image_cache.file_path = os.path.join(directory.name, 'wiki_images.json')
+    image_cache.clear()
+
+    def get_fixture_image(wiki_url):
+        page = wiki_url.rstrip('/').rsplit('/', 1)[-1].lower()
+        return utils.get_wiki_image(wiki.url(page))
+    def get_fixture_images(wiki_urls, **kwargs):
+        return {wiki_url: get_fixture_image(wiki_url) for wiki_url in wiki_urls}
+    resolver.get_wiki_image = get_fixture_image
+    prefetcher.get_wiki_images = get_fixture_images
+
+    session_log.directory = os.path.join(directory.name, 'history')
+    session_log.start()
+    publish_presence_settings(DEFAULT_PRESENCE_SETTINGS)
+
+    stop_flag = threading.Event()
+    presence_thread = threading.Thread(target=run_presence, args=(stop_flag,), daemon=True)
+    presence_thread.start()
+
+    if backend == 'flask':
+        from werkzeug.serving import make_server
+        from server.server import create_app
+        server = make_server('127.0.0.1', 0, create_app(), threaded=True)
+        port = server.server_port
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    else:
+        from server.async_server import AsyncServerThread
+        server = AsyncServerThread('127.0.0.1', 0)
+        server.daemon = True
+        server.start()
+        server.ready.wait()
+        port = server.server.port
+
+    print(json.dumps({'port': port, 'pid': os.getpid()}), file=replies, flush=True)
+    for line in sys.stdin:
+        if line.strip() == 'stats':
+            print(json.dumps(process_stats()), file=replies, flush=True)
+
+    stop_flag.set()
+    wake_presence()
+    session_log.close()
+    wiki.stop()
+
+def process_stats() -> dict:
+    """Returns the CPU time and memory of this process and the updates sent to the stub Discord."""
+    return {
+        'cpu_seconds': time.process_time(),
+        'rss_kib': read_rss_kib(),
+        'peak_rss_kib': read_peak_rss_kib(),
+        'discord_updates': StubPresence.updates
+    }
+
+def synthesize(file_path: str, count: int, seed: int = 1):
+    """Writes a plausible single tab session: one full update, then changes every half second."""
+    rng = random.Random(seed)
+    room = rng.choice(WIKI_ROOMS)
+    state = {
+        'gameType': '2kki',
+        'location': room,
+        'badgeImageUrl': None,
+        'playersOnline': 120,
+        'playersOnMap': 3,
+        'wikiPageUrl': f"https://yume.wiki/2kki/{room.replace(' ', '_')}"
+    }
+    focused = True
+    with open(file_path, 'w', encoding='utf-8') as file:
+        for seq in range(1, count + 1):
+            if seq == 1:
+                changes = dict(state)
+            else:
+                changes = {'playersOnline': max(1, state['playersOnline'] + rng.randint(-3, 3))}
+                roll = rng.random()
+                if roll < 0.2:
+                    room = rng.choice(WIKI_ROOMS)
+                    changes.update(location=room, wikiPageUrl=f"https://yume.wiki/2kki/{room.replace(' ', '_')}", playersOnMap=rng.randint(1, 6))
+                elif roll < 0.25:
+                    # Map still loading
+                    changes.update(location=None, wikiPageUrl=None)
+                elif roll < 0.3:
+                    focused = not focused
+                state.update(changes)
+            body = {'seq': seq, 'full': seq == 1, 'changes': changes, 'clientId': 'tab-1', 'focused': focused}
+            file.write(json.dumps({'t': round(seq * 0.5, 3), 'route': '/update', 'body': body}) + '\n')
+
+def load_payloads(file_path: str) -> list:
+    with open(file_path, 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+def expand_tabs(payloads: list, tabs: int) -> list:
+    """Repeats the traffic as if it came from several tabs; only the first keeps its focus."""
+    if tabs <= 1:
+        return payloads
+    expanded = []
+    for payload in payloads:
+        for tab in range(tabs):
+            body = dict(payload['body'] or {})
+            body['clientId'] = f"{body.get('clientId') or 'default'}-{tab}"
+            if tab > 0:
+                body['focused'] = False
+            expanded.append({**payload, 'body': body})
+    return expanded
+
+MALFORMED_REQUESTS = (
+    ('/update', b'{"seq": '),
+    ('/update', json.dumps({'changes': {'location': 'Nowhere'}}).encode('utf-8')),
+    ('/receive_from_2kki', b''),
+    ('/receive_from_2kki', b'[1, 2, 3'),
+)
+
+def add_malformed(payloads: list, fraction: float, rng: random.Random) -> list:
+    """Mixes in broken requests, as a misbehaving extension build would send."""
+    if fraction <= 0:
+        return payloads
+    mixed = []
+    for payload in payloads:
+        mixed.append(payload)
+        if rng.random() < fraction:
+            route, raw = rng.choice(MALFORMED_REQUESTS)
+            mixed.append({'t': payload['t'], 'route': route, 'raw': raw})
+    return mixed
+
+class ClientModel:
+    """The state one extension client has sent, tracked like the server tracks it."""
+    def __init__(self):
+        self.fields = None
+
+    def apply(self, route: str, body: dict):
+        from server.channel import PAYLOAD_FIELDS, payload_to_fields
+        from shared.data import GameState
+        if route == '/receive_from_2kki':
+            self.fields = {field: body.get(key) for key, field in PAYLOAD_FIELDS}
+            return
+        if body.get('full'):
+            self.fields = GameState()._asdict()
+            del self.fields['version']
+        if self.fields is not None:
+            self.fields.update(payload_to_fields(body.get('changes') or {}))
+
+    def full_update(self, body: dict) -> dict:
+        """
+        Builds the full update the extension sends after a resync request.
+
+        A recording may start in the middle of a session, in which case only the fields
+        sent since then are known.
+        """
+        from server.channel import PAYLOAD_FIELDS
+        current = {key: self.fields.get(field) for key, field in PAYLOAD_FIELDS} if self.fields else {}
+        current.update(body.get('changes') or {})
+        return {**body, 'full': True, 'changes': current}
+
+class Worker(threading.Thread):
+    """Sends the requests of its clients in order over one keep-alive connection."""
+    def __init__(self, port: int, requests: list, start_at: float):
+        super().__init__(daemon=True)
+        self.port = port
+        self.requests = requests
+        self.start_at = start_at
+        self.latencies = []
+        self.errors = 0
+        self.rejected = 0
+        self.resyncs = 0
+        self.models = {}
+
+    def run(self):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port)
+        headers = {'Content-Type': 'application/json'}
+        for at, payload in self.requests:
+            delay = self.start_at + at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+            if 'raw' in payload:
+                status, _ = self.send(connection, payload['route'], payload['raw'], headers)
+                self.rejected += status is not None and status >= 400
+                continue
+
+            body = payload['body']
+            client_id = (body or {}).get('clientId') or 'default'
+            model = self.models.setdefault(client_id, ClientModel())
+            status, result = self.send(connection, payload['route'], json.dumps(body).encode('utf-8'), headers)
+            if status == 200 and result.get('status') == 'resync':
+                self.resyncs += 1
+                body = model.full_update(body)
+                status, result = self.send(connection, payload['route'], json.dumps(body).encode('utf-8'), headers)
+            if status != 200 or result.get('status') != 'success':
+                self.errors += 1
+                continue
+            model.apply(payload['route'], body)
+        connection.close()
+
+    def send(self, connection, route: str, body: bytes, headers: dict):
+        start = time.perf_counter()
+        try:
+            connection.request('POST', route, body=body, headers=headers)
+            response = connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self.latencies.append(time.perf_counter() - start)
+            return None, {}
+        self.latencies.append(time.perf_counter() - start)
+        try:
+            result = json.loads(content) if response.status == 200 else {}
+        except ValueError:
+            result = {}
+        return response.status, result if isinstance(result, dict) else {}
+
+def schedule(payloads: list, rate: float, speed: float) -> list:
+    """Returns (seconds after start, payload) pairs for the chosen pacing."""
+    if rate:
+        return [(index / rate, payload) for index, payload in enumerate(payloads)]
+    if speed:
+        first = payloads[0]['t'] if payloads else 0
+        return [((payload['t'] - first) / speed, payload) for payload in payloads]
+    return [(0, payload) for payload in payloads]
+
+def shard(timed: list, concurrency: int) -> list:
+    """Splits the requests between the workers, keeping every client on the same one."""
+    assignment = {}
+    shards = [[] for _ in range(concurrency)]
+    for at, payload in timed:
+        client_id = (payload.get('body') or {}).get('clientId') or 'default'
+        worker = assignment.setdefault(client_id, len(assignment) % concurrency)
+        shards[worker].append((at, payload))
+    return shards
+
+def get_json(port: int, path: str) -> dict:
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    try:
+        connection.request('GET', path)
+        return json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+def check_state(port: int, models: dict) -> dict:
+    """Waits for the server to settle on the final state of its active client and compares them."""
+    deadline = time.perf_counter() + SETTLE_TIMEOUT
+    while True:
+        current = get_json(port, '/state')
+        state = current['state']
+        state.pop('version', None)
+        model = models.get(current['source'])
+        expected = model.fields if model is not None else None
+        if state == expected or time.perf_counter() > deadline:
+            break
+        time.sleep(0.1)
+    return {'ok': state == expected, 'source': current['source'], 'state': state, 'expected': expected}
+
+def run(args) -> dict:
+    rng = random.Random(args.seed)
+    payloads = add_malformed(expand_tabs(load_payloads(args.file), args.tabs), args.malformed, rng)
+    shards = shard(schedule(payloads, args.rate, args.speed), args.concurrency)
+
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.replay', 'serve', args.server],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    try:
+        port = json.loads(process.stdout.readline())['port']
+
+        def stats():
+            process.stdin.write('stats\n')
+            process.stdin.flush()
+            return json.loads(process.stdout.readline())
+
+        before = stats()
+        start_at = time.perf_counter() + 0.1
+        workers = [Worker(port, requests, start_at) for requests in shards if requests]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start_at
+
+        models = {}
+        for worker in workers:
+            models.update(worker.models)
+        state = check_state(port, models)
+        after = stats()
+    finally:
+        process.stdin.close()
+        process.wait()
+
+    latencies = sorted(latency for worker in workers for latency in worker.latencies)
+    valid = sum(1 for _, payload in (item for requests in shards for item in requests) if 'raw' not in payload)
+    errors = sum(worker.errors for worker in workers)
+    return {
+        'requests': len(latencies),
+        'seconds': elapsed,
+        'requests_per_sec': len(latencies) / elapsed if elapsed > 0 else 0,
+        'p50_ms': percentile(latencies, 0.5) * 1000 if latencies else 0,
+        'p95_ms': percentile(latencies, 0.95) * 1000 if latencies else 0,
+        'p99_ms': percentile(latencies, 0.99) * 1000 if latencies else 0,
+        'error_rate': errors / valid if valid else 0,
+        'rejected_malformed': sum(worker.rejected for worker in workers),
+        'resyncs': sum(worker.resyncs for worker in workers),
+        'server_cpu_seconds': after['cpu_seconds'] - before['cpu_seconds'],
+        'server_rss_kib': after['rss_kib'],
+        'server_peak_rss_kib': after['peak_rss_kib'],
+        'discord_updates': after['discord_updates'],
+        'state_ok': state['ok'],
+        'state': state
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    synth = commands.add_parser('synthesize', help='write a synthetic single tab session')
+    synth.add_argument('file')
+    synth.add_argument('--count', type=int, default=500)
+    synth.add_argument('--seed', type=int, default=1)
+    replay = commands.add_parser('run', help='replay a payload file against a fresh server')
+    replay.add_argument('file')
+    pacing = replay.add_mutually_exclusive_group()
+    pacing.add_argument('--rate', type=float, help='requests per second over all connections')
+    pacing.add_argument('--speed', type=float, help='multiple of the recorded pace, e.g. 10')
+    replay.add_argument('--concurrency', type=int, default=4, help='concurrent connections')
+    replay.add_argument('--tabs', type=int, default=1, help='replay the traffic as if from this many tabs')
+    replay.add_argument('--malformed', type=float, default=0, help='fraction of broken requests to mix in')
+    replay.add_argument('--server', choices=('asyncio', 'flask'), default='asyncio')
+    replay.add_argument('--seed', type=int, default=1)
+    replay.add_argument('--output', help='write the results as JSON to this file')
+    serve_parser = commands.add_parser('serve', help=argparse.SUPPRESS)
+    serve_parser.add_argument('backend')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.backend)
+        return
+    if args.command == 'synthesize':
+        synthesize(args.file, args.count, args.seed)
+        return
+
+    result = run(args)
+    print(f"{'requests':<22}{result['requests']:>12}")
+    print(f"{'requests/s':<22}{result['requests_per_sec']:>12.0f}")
+    for name in ('p50_ms', 'p95_ms', 'p99_ms'):
+        print(f"{name.replace('_ms', ' ms'):<22}{result[name]:>12.2f}")
+    print(f"{'error rate':<22}{result['error_rate']:>12.2%}")
+    print(f"{'malformed rejected':<22}{result['rejected_malformed']:>12}")
+    print(f"{'resyncs':<22}{result['resyncs']:>12}")
+    print(f"{'server CPU s':<22}{result['server_cpu_seconds']:>12.2f}")
+    print(f"{'server RSS KiB':<22}{result['server_rss_kib']:>12}")
+    print(f"{'discord updates':<22}{result['discord_updates']:>12}")
+    print(f"{'final state':<22}{'ok' if result['state_ok'] else 'MISMATCH':>12}")
+    if not result['state_ok']:
+        print(f"  source {result['state']['source']}\n  got      {result['state']['state']}\n  expected {result['state']['expected']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(result, file, indent=4)
+    if not result['state_ok'] or result['error_rate'] > 0:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""
+Microbenchmarks for the presence hot path.
+
+Every case is timed call by call, reporting throughput, median and 99th percentile
+latency, and the memory allocated while running it. Results can be written as JSON and
+compared against a previously saved run, which fails when a case got slower than the
+allowed threshold. Everything runs offline: wiki pages come from a local fixture server.
+
+Usage (from the 2kRP_Presence directory):
+    python -m benchmarks.run [--filter TEXT] [--output results.json] [--baseline baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Timed calls per case, and the calls made before timing to fill caches and pools
+DEFAULT_ITERATIONS = 2000
+WARMUP_ITERATIONS = 50
+# Slowest cases are capped so a full run stays within seconds
+MAX_CASE_SECONDS = 3
+DEFAULT_THRESHOLD = 0.2
+
+CASES = []
+
+def case(name: str, iterations: int = DEFAULT_ITERATIONS):
+    """
+    Registers a benchmark case.
+
+    The decorated function does the setup and returns the callable to time, plus an
+    optional cleanup callable.
+    """
+    def register(setup):
+        CASES.append((name, iterations, setup))
+        return setup
+    return register
+
+@case('replace_patterns')
+def bench_replace_patterns():
+    from utils.utils import replace_patterns
+    text = '{playersonline} players online and {playersonmap} on {location} ({gametype})'
+    replacements = {'playersonline': '120 players', 'playersonmap': '3 players', 'location': 'Urban Street', 'gametype': 'Yume 2kki'}
+    return lambda: replace_patterns(text, replacements)
+
+@case('get_translated_string')
+def bench_get_translated_string():
+    from utils.utils import get_translated_string
+    return lambda: get_translated_string('presence_player_entity')
+
+def publish_benchmark_settings():
+    """Publishes settings that only use badge and custom images, so no wiki lookup happens."""
+    from shared.settings import DEFAULT_PRESENCE_SETTINGS, publish_presence_settings
+    publish_presence_settings(DEFAULT_PRESENCE_SETTINGS._replace(large_image='use_custom_url', small_image='use_badge'))
+
+@case('fetch_presence_data/unchanged')
+def bench_fetch_presence_unchanged():
+    from shared.data import update_data
+    from presence.presence import fetch_presence_data
+    publish_benchmark_settings()
+    update_data('2kki', 'Urban Street', None, 120, 3, None)
+    return fetch_presence_data
+
+@case('fetch_presence_data/new_data')
+def bench_fetch_presence_new_data():
+    from shared.data import update_data
+    from presence.presence import fetch_presence_data
+    publish_benchmark_settings()
+    counter = iter(range(sys.maxsize))
+
+    def run():
+        update_data('2kki', 'Urban Street', None, 100 + next(counter) % 50, 3, None)
+        return fetch_presence_data()
+    return run
+
+@case('DataStore.update_data')
+def bench_update_data():
+    from shared.data import DataStore
+    store = DataStore()
+    counter = iter(range(sys.maxsize))
+    return lambda: store.update_data('2kki', 'Urban Street', None, next(counter), 3, None)
+
+def wiki_image_case(mode: str):
+    """
+    Builds a room image case against the fixture server.
+
+    'fresh' answers from the image cache, 'revalidate' costs a 304 round trip and 'fetch'
+    downloads and parses the whole page every time. 'api' resolves the page through the
+    stand-in wiki API instead, and 'api_batch' every fixture page with one API request.
+    """
+    def setup():
+        from benchmarks.fixture_server import FixtureServer
+        from utils import utils
+        from utils.image_cache import ImageCache
+
+        server = FixtureServer().start()
+        directory = tempfile.TemporaryDirectory()
+        original_cache = utils.image_cache
+        cache = ImageCache(os.path.join(directory.name, 'wiki_images.json'), ttl=0 if mode == 'revalidate' else 3600)
+        utils.image_cache = cache
+        url = server.url('urban_street')
+        urls = [server.url(page) for page in sorted(server.pages)]
+        # Pages without an image are left to the HTML fallback
+        with_image = sum(1 for image_url, _ in server.titles.values() if image_url)
+
+        def run():
+            if mode in ('fetch', 'api', 'api_batch'):
+                cache.clear()
+            if mode == 'api_batch':
+                images = utils.get_wiki_images(urls, fallback=False)
+                if len(images) != with_image:
+                    raise RuntimeError(f"The API resolved {len(images)} of {with_image} pages")
+                return
+            # The HTML cases bypass the API to keep measuring the page path
+            image_url = utils.get_wiki_image(url) if mode in ('fresh', 'api') else utils.get_wiki_image_from_page(url)
+            if image_url is None:
+                raise RuntimeError(f"No image resolved from {url}")
+
+        def cleanup():
+            utils.image_cache = original_cache
+            server.stop()
+            directory.cleanup()
+        return run, cleanup
+    return setup
+
+case('get_wiki_image/fresh')(wiki_image_case('fresh'))
+case('get_wiki_image/revalidate', 300)(wiki_image_case('revalidate'))
+case('get_wiki_image/fetch', 300)(wiki_image_case('fetch'))
+case('get_wiki_image/api', 300)(wiki_image_case('api'))
+case('get_wiki_images/api_batch', 300)(wiki_image_case('api_batch'))
+
+@case('image_index.lookup')
+def bench_image_index_lookup():
+    from utils.image_index import ImageIndex, build_index
+    directory = tempfile.TemporaryDirectory()
+    file_path = os.path.join(directory.name, 'wiki_image_index.bin')
+    build_index(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures'), file_path)
+    index = ImageIndex(file_path)
+
+    def run():
+        if index.lookup('https://yume.wiki/2kki/Urban_Street') is None:
+            raise RuntimeError("Urban Street is missing from the image index")
+
+    def cleanup():
+        index.close()
+        directory.cleanup()
+    return run, cleanup
+
+@case('route/receive_from_2kki', 500)
+def bench_receive_route():
+    from server.server import create_app
+    client = create_app().test_client()
+    counter = iter(range(sys.maxsize))
+
+    def run():
+        response = client.post('/receive_from_2kki', json={
+            'gameType': '2kki',
+            'location': 'Urban Street',
+            'badgeImageUrl': None,
+            'playersOnline': 100 + next(counter) % 50,
+            'playersOnMap': 3,
+            'wikiPageUrl': None
+        })
+        if response.status_code != 200:
+            raise RuntimeError(f"Route answered {response.status_code}")
+    return run
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def measure(function, iterations: int) -> dict:
+    """Times 'function' call by call, then traces the allocations of a second batch of calls."""
+    for _ in range(WARMUP_ITERATIONS):
+        function()
+
+    timings = []
+    deadline = time.perf_counter_ns() + MAX_CASE_SECONDS * 1_000_000_000
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        function()
+        timings.append(time.perf_counter_ns() - start)
+        if start > deadline:
+            break
+
+    traced_calls = min(len(timings), 200)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    for _ in range(traced_calls):
+        function()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename') if stat.size_diff > 0)
+
+    timings.sort()
+    return {
+        'iterations': len(timings),
+        'ops_per_sec': len(timings) / (sum(timings) / 1e9),
+        'p50_us': percentile(timings, 0.5) / 1000,
+        'p99_us': percentile(timings, 0.99) / 1000,
+        'peak_alloc_kib': peak / 1024,
+        'retained_bytes_per_op': allocated / traced_calls
+    }
+
+def run_cases(name_filter: str = None) -> dict:
+    results = {}
+    for name, iterations, setup in CASES:
+        if name_filter and name_filter not in name:
+            continue
+        prepared = setup()
+        function, cleanup = prepared if isinstance(prepared, tuple) else (prepared, None)
+        try:
+            results[name] = measure(function, iterations)
+        finally:
+            if cleanup is not None:
+                cleanup()
+    return results
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Returns the names of the cases whose throughput dropped by more than 'threshold'."""
+    regressions = []
+    print(f"\n{'case':<32}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        change = result['ops_per_sec'] / previous['ops_per_sec'] - 1
+        flag = ''
+        if change < -threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<32}{previous['ops_per_sec']:>12.0f}{result['ops_per_sec']:>12.0f}{change:>+8.0%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--filter', help='only run cases whose name contains this text')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='compare against results saved with --output')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='allowed throughput drop, 0.2 = 20%%')
+    args = parser.parse_args()
+
+    results = run_cases(args.filter)
+
+    print(f"{'case':<32}{'ops/s':>12}{'p50 us':>10}{'p99 us':>10}{'peak KiB':>10}{'B/op':>8}")
+    for name, result in results.items():
+        print(
+            f"{name:<32}{result['ops_per_sec']:>12.0f}{result['p50_us']:>10.1f}{result['p99_us']:>10.1f}"
+            f"{result['peak_alloc_kib']:>10.1f}{result['retained_bytes_per_op']:>8.0f}"
+        )
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'python': platform.python_version(), 'platform': platform.platform(), 'results': results}, file, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            raise SystemExit(f"{len(regressions)} case(s) regressed: {', '.join(regressions)}")
+
+if __name__ == '__main__':
+    main()
@@ -6,18 +6,34 @@ from PySide6.QtWidgets import (
     QMenu, QMessageBox, QButtonGroup, QRadioButton, QStackedWidget
 )
 from PySide6.QtGui import QIcon, QAction
-from PySide6.QtCore import Qt, QSettings
-from qt_material import apply_stylesheet
-from utils.utils import validate_url, get_translated_string
+from PySide6.QtCore import Qt
+from utils.utils import validate_url, get_translated_string, replace_patterns
+from utils.translations import get_language_code, set_language_code
 from utils.constants import get_app_version
+from utils.startup import startup_timer
+from utils.memory import take_memory_snapshot, stop_memory_tracing
+from presence.presence import find_unknown_placeholders
+from shared.settings import (
+    DEFAULT_PRESENCE_SETTINGS,
+    get_presence_settings,
+    open_settings,
+    publish_presence_settings,
+    read_presence_settings,
+    write_default_presence_settings,
+)
 from app_context import set_main_window
+from interface.stylesheet_cache import apply_theme
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, lazy_tabs: bool = False):
         super().__init__()
+        # Window construction is broken down in the startup report (--startup-report)
         self.init_settings()
+        startup_timer.mark('window_settings')
         self.init_ui()
+        startup_timer.mark('window_theme')
         self.init_system_tray()
+        startup_timer.mark('window_tray')
 
         # Create tabs
         self.tabs = QTabWidget()
@@ -29,18 +45,25 @@ class MainWindow(QMainWindow):
         self.tabs.addTab(self.tab_presence, get_translated_string("qtui_tab_presence"))
         self.tabs.addTab(self.tab_settings, get_translated_string("qtui_tab_settings"))
 
-        # Initialize tabs
+        # Initialize tabs; in low-memory mode the rarely opened ones are built on first view
+        self.pending_tabs = {}
         self.init_home_tab()
-        self.init_presence_tab()
-        self.init_settings_tab()
+        startup_timer.mark('tab_home')
+        if lazy_tabs:
+            self.pending_tabs = {self.tab_presence: self.init_presence_tab, self.tab_settings: self.init_settings_tab}
+            self.tabs.currentChanged.connect(self.build_pending_tab)
+        else:
+            self.init_presence_tab()
+            startup_timer.mark('tab_presence')
+            self.init_settings_tab()
+            startup_timer.mark('tab_settings')
 
         # Set central widget
         self.setCentralWidget(self.tabs)
 
     def init_settings(self):
         # Load settings from QSettings
-        QSettings.setDefaultFormat(QSettings.IniFormat)
-        self.settings = QSettings("2kRP", "2kRP_Presence_Controller")
+        self.settings = open_settings()
         
         # Creates default settings if they do not exist
         if not self.settings.contains("start_on_boot"):
@@ -50,18 +73,9 @@ class MainWindow(QMainWindow):
         if not self.settings.contains("theme"):
             self.settings.setValue("theme", "Light")
             
-        # Creates presence settings if they do not exist
-        if not self.settings.contains("presence"):
-            self.settings.setValue("presence", {
-                "details": "Playing {gametype}",
-                "state": "In: {location}",
-                "large_image": "use_current_room",
-                "small_image": "use_badge",
-                "large_image_text": "{playersonline} players online and {playersonmap} on the current map",
-                "small_image_text": "  ",
-                "large_image_url": "https://i.imgur.com/TN8WK7E.png",
-                "small_image_url": "https://i.imgur.com/TN8WK7E.png",
-            })
+        # Creates presence settings if they do not exist and publishes them to the presence thread
+        write_default_presence_settings(self.settings)
+        publish_presence_settings(read_presence_settings(self.settings))
             
     def init_ui(self):
         self.setWindowTitle("2kRP Presence Controller")
@@ -73,7 +87,11 @@ class MainWindow(QMainWindow):
         icon_path = os.path.join(file_path, "icon.png")
         
         self.setWindowIcon(QIcon(icon_path))
-        apply_stylesheet(QApplication.instance(), theme="light_pink.xml" if self.settings.value("theme") == "Light" else "dark_pink.xml", invert_secondary=True if self.settings.value("theme") == "Light" else False)
+        self.apply_theme(self.settings.value("theme"))
+
+    def apply_theme(self, theme):
+        """Applies the Light or Dark theme, reusing the stylesheet rendered on a previous run."""
+        apply_theme(QApplication.instance(), "light_pink.xml" if theme == "Light" else "dark_pink.xml", invert_secondary=theme == "Light")
 
     def init_system_tray(self):
         file_path = os.path.dirname(os.path.abspath(__file__))
@@ -87,6 +105,10 @@ class MainWindow(QMainWindow):
         show_action.triggered.connect(self.show_window)
         tray_menu.addAction(show_action)
         
+        memory_action = QAction(get_translated_string("qtui_tray_option_memory_report"), self)
+        memory_action.triggered.connect(self.show_memory_report)
+        tray_menu.addAction(memory_action)
+        
         exit_action = QAction(get_translated_string("qtui_tray_option_exit"), self)
         exit_action.triggered.connect(self.close_app)
         tray_menu.addAction(exit_action)
@@ -114,6 +136,39 @@ class MainWindow(QMainWindow):
             )
             event.ignore()
                 
+    def build_pending_tab(self, index):
+        init_tab = self.pending_tabs.pop(self.tabs.widget(index), None)
+        if init_tab is not None:
+            init_tab()
+    
+    def show_memory_report(self):
+        """Shows the memory use and the modules holding the most memory, starting allocation tracing on first use until its stop button is pressed."""
+        report = take_memory_snapshot()
+        lines = [
+            get_translated_string("qtui_memory_report_rss").format(rss=report['rss_kib'] // 1024, peak=report['peak_rss_kib'] // 1024),
+            get_translated_string("qtui_memory_report_traced").format(traced=report['traced_kib'] // 1024, peak=report['traced_peak_kib'] // 1024),
+            "",
+            get_translated_string("qtui_memory_report_top_modules")
+        ]
+        lines += [f"{entry['size_kib']:>10,.0f} KiB  {entry['module']}" for entry in report['top_modules'][:10]]
+        lines.append("")
+        if report['since_previous']:
+            lines.append(get_translated_string("qtui_memory_report_growth"))
+            lines += [f"{entry['size_diff_kib']:>+10,.0f} KiB  {entry['module']}" for entry in report['since_previous'][:10]]
+        else:
+            lines.append(get_translated_string("qtui_memory_report_first"))
+        
+        msgBox = QMessageBox()
+        msgBox.setIcon(QMessageBox.Information)
+        msgBox.setWindowTitle(get_translated_string("qtui_memory_report_title"))
+        msgBox.setText("\n".join(lines))
+        msgBox.setStyleSheet("QLabel { font-family: monospace; }")
+        msgBox.setStandardButtons(QMessageBox.Ok)
+        stop_button = msgBox.addButton(get_translated_string("qtui_memory_report_stop"), QMessageBox.DestructiveRole)
+        msgBox.exec()
+        if msgBox.clickedButton() is stop_button:
+            stop_memory_tracing()
+                
     def show_window(self):
         self.show()
         self.activateWindow()
@@ -203,10 +258,11 @@ class MainWindow(QMainWindow):
         self.small_image_input.setPlaceholderText(get_translated_string("qtui_presence_placeholder_small_image"))
         
         # Load existing presence settings
-        self.details_input.setText(self.settings.value("presence/details", ""))
-        self.state_input.setText(self.settings.value("presence/state", ""))
-        self.large_image_input.setText(self.settings.value("presence/large_image_text", ""))
-        self.small_image_input.setText(self.settings.value("presence/small_image_text", ""))
+        presence_settings = get_presence_settings()
+        self.details_input.setText(presence_settings.details)
+        self.state_input.setText(presence_settings.state)
+        self.large_image_input.setText(presence_settings.large_image_text)
+        self.small_image_input.setText(presence_settings.small_image_text)
         
         # Misc buttons
         self.save_presence_btn = QPushButton(get_translated_string("qtui_presence_btn_save_preferences"))
@@ -235,18 +291,18 @@ class MainWindow(QMainWindow):
             radio_group.addButton(use_custom_url)
 
             # Set checked state from settings
-            value = self.settings.value(f"{prefix}_image")
-            if value == "current_room":
+            value = getattr(presence_settings, f"{prefix}_image")
+            if value == "use_current_room":
                 use_current_room.setChecked(True)
-            elif value == "badge":
+            elif value == "use_badge":
                 use_badge.setChecked(True)
-            elif value == "custom_url":
+            elif value == "use_custom_url":
                 use_custom_url.setChecked(True)
             else:
                 use_current_room.setChecked(True)
                 
             # Set custom URL from settings
-            custom_url = self.settings.value(f"{prefix}_image_url", "https://i.imgur.com/TN8WK7E.png")
+            custom_url = getattr(presence_settings, f"{prefix}_image_url")
             custom_url_input.setText(custom_url)
 
             return (radio_group, use_current_room, use_badge, use_custom_url, custom_url_input)
@@ -316,14 +372,13 @@ class MainWindow(QMainWindow):
         self.start_minimized.setChecked(self.settings.value("start_minimized", True, type=bool))
         self.theme_combo.setCurrentText(self.settings.value("theme", "Light"))
         
-        with open("language.txt", "r", encoding="utf-8") as file:
-            language = file.read().strip()
-            if language == "en":
-                self.language_combo.setCurrentText("English")
-            elif language == "pt_br":
-                self.language_combo.setCurrentText("Português (BR)")
-            else:
-                self.language_combo.setCurrentText("English")
+        language = get_language_code()
+        if language == "en":
+            self.language_combo.setCurrentText("English")
+        elif language == "pt_br":
+            self.language_combo.setCurrentText("Português (BR)")
+        else:
+            self.language_combo.setCurrentText("English")
         
         # Labels
         self.application_settings_label = QLabel(get_translated_string("qtui_settings_label_application_settings"))
@@ -338,9 +393,7 @@ class MainWindow(QMainWindow):
         self.start_minimized.stateChanged.connect(lambda: self.settings.setValue("start_minimized", self.start_minimized.isChecked()))
         self.language_combo.currentTextChanged.connect(lambda: self.update_language_code())
         self.theme_combo.currentTextChanged.connect(lambda: self.settings.setValue("theme", self.theme_combo.currentText()))
-        self.theme_combo.currentTextChanged.connect(
-            lambda: apply_stylesheet(QApplication.instance(), theme="light_pink.xml" if self.theme_combo.currentText() == "Light" else "dark_pink.xml", invert_secondary=True if self.theme_combo.currentText() == "Light" else False)
-        )
+        self.theme_combo.currentTextChanged.connect(lambda: self.apply_theme(self.theme_combo.currentText()))
         
         self.add_tooltip(self.start_on_boot, get_translated_string("qtui_settings_tooltip_start_on_boot"))
         self.add_tooltip(self.start_minimized, get_translated_string("qtui_settings_tooltip_start_on_tray"))
@@ -359,14 +412,11 @@ class MainWindow(QMainWindow):
         """Update the language code based on the selected language."""
         language_code = self.language_combo.currentText()
         if language_code == "English":
-            with open("language.txt", "w", encoding="utf-8") as file:
-                file.write("en")
+            set_language_code("en")
         elif language_code == "Português (BR)":
-            with open("language.txt", "w", encoding="utf-8") as file:
-                file.write("pt_br")
+            set_language_code("pt_br")
         else:
-            with open("language.txt", "w", encoding="utf-8") as file:
-                file.write("en")
+            set_language_code("en")
                 
         # Message box to inform the user
         msgBox = QMessageBox()
@@ -378,22 +428,38 @@ class MainWindow(QMainWindow):
         msgBox.exec()
     
     def save_presence(self):
+        unknown_patterns = []
+        for text_input in (self.details_input, self.state_input, self.large_image_input, self.small_image_input):
+            for pattern in find_unknown_placeholders(text_input.text()):
+                if pattern not in unknown_patterns:
+                    unknown_patterns.append(pattern)
+        
+        if unknown_patterns:
+            QMessageBox.warning(
+                self,
+                get_translated_string("qtui_presence_msgbox_unknown_patterns_title"),
+                replace_patterns(get_translated_string("qtui_presence_msgbox_unknown_patterns_text"), {"patterns": ", ".join(f"{{{pattern}}}" for pattern in unknown_patterns)}),
+                QMessageBox.Ok
+            )
+            return
+        
         self.settings.setValue("presence/details", self.details_input.text())
         self.settings.setValue("presence/state", self.state_input.text())
         self.settings.setValue("presence/large_image_text", self.large_image_input.text())
         self.settings.setValue("presence/small_image_text", self.small_image_input.text())
         
-        if not validate_url(self.large_use_custom_url.text()):
-            self.large_use_custom_url_input.setText("https://i.imgur.com/TN8WK7E.png")
+        if not validate_url(self.large_use_custom_url_input.text()):
+            self.large_use_custom_url_input.setText(DEFAULT_PRESENCE_SETTINGS.large_image_url)
         
-        if not validate_url(self.small_use_custom_url.text()):
-            self.small_use_custom_url_input.setText("https://i.imgur.com/TN8WK7E.png")
+        if not validate_url(self.small_use_custom_url_input.text()):
+            self.small_use_custom_url_input.setText(DEFAULT_PRESENCE_SETTINGS.small_image_url)
             
         self.settings.setValue("presence/large_image", "use_current_room" if self.large_use_current_room.isChecked() else "use_badge" if self.large_use_badge.isChecked() else "use_custom_url")
         self.settings.setValue("presence/small_image", "use_current_room" if self.small_use_current_room.isChecked() else "use_badge" if self.small_use_badge.isChecked() else "use_custom_url")
         self.settings.setValue("presence/large_image_url", self.large_use_custom_url_input.text())
         self.settings.setValue("presence/small_image_url", self.small_use_custom_url_input.text())
         self.settings.sync()
+        publish_presence_settings(read_presence_settings(self.settings))
         QMessageBox.information(self, get_translated_string("qtui_presence_msgbox_preferences_saved_title"), get_translated_string("qtui_presence_msgbox_preferences_saved_text"), QMessageBox.Ok)
         
         
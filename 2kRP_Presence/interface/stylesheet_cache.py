@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import platform
+from importlib import metadata, util
+from PySide6.QtCore import QDir
+from PySide6.QtGui import QColor, QFontDatabase, QGuiApplication, QPalette
+from utils.constants import STYLESHEET_CACHE_DIR
+
+# Bump when the cached files change shape
+CACHE_FORMAT = 1
+THEME_STYLE = 'Fusion'
+# Environment variables qt_material sets while building a theme, restored on cache hits
+THEME_ENVIRON_PREFIX = 'QTMATERIAL_'
+
+class StylesheetCache:
+    """
+    On-disk cache of the stylesheets rendered by qt_material.
+
+    Rendering a theme means importing jinja2, rendering the whole QSS template and writing
+    the themed icons, which holds up the window on every launch and freezes it on every
+    theme toggle. Each theme variant gets its own directory with the rendered sheet, its
+    icons and the state qt_material leaves behind, so later launches and toggles only read
+    a file. An entry is rebuilt when the qt_material version, the theme XML or the template
+    changes.
+    """
+    def __init__(self, directory: str = STYLESHEET_CACHE_DIR):
+        self.directory = directory
+        self._fonts_loaded = False
+        self._package_dir = None
+
+    def apply(self, app, theme: str, invert_secondary: bool = False) -> bool:
+        """
+        Applies a qt_material theme to the application, from the cache when possible.
+
+        Returns:
+            bool: True if the stylesheet came from the cache.
+        """
+        variant_dir = os.path.abspath(os.path.join(self.directory, self.variant_name(theme, invert_secondary)))
+        key = self.cache_key(theme, invert_secondary)
+        entry = self.load(variant_dir, key)
+
+        app.setStyle(THEME_STYLE)
+        if entry is not None:
+            self._load_fonts()
+            os.environ.update(entry['environ'])
+            self._set_text_color(entry['primary_color'])
+            self._set_icon_path(variant_dir)
+            app.setStyleSheet(entry['stylesheet'])
+            return True
+
+        stylesheet, entry = self.build(variant_dir, theme, invert_secondary)
+        if stylesheet is None:
+            return False
+        self._set_icon_path(variant_dir)
+        app.setStyleSheet(stylesheet)
+        self.save(variant_dir, key, stylesheet, entry)
+        return False
+
+    def build(self, variant_dir: str, theme: str, invert_secondary: bool):
+        """Renders a theme with qt_material, writing its icons into the variant directory."""
+        from qt_material import build_stylesheet
+
+        # qt_material loads the fonts and sets the palette and search paths itself
+        self._fonts_loaded = True
+        stylesheet = build_stylesheet(theme, invert_secondary, parent=variant_dir)
+        if stylesheet is None:
+            return None, None
+        entry = {
+            'environ': {name: value for name, value in os.environ.items() if name.startswith(THEME_ENVIRON_PREFIX)},
+            'primary_color': os.environ.get('QTMATERIAL_PRIMARYCOLOR')
+        }
+        return stylesheet, entry
+
+    def load(self, variant_dir: str, key: str):
+        """Returns the cached entry of a variant if it was built for the given key, otherwise None."""
+        try:
+            with open(os.path.join(variant_dir, 'theme.json'), 'r', encoding='utf-8') as file:
+                entry = json.load(file)
+            if entry.get('key') != key or not os.path.isdir(os.path.join(variant_dir, 'primary')):
+                return None
+            with open(os.path.join(variant_dir, 'theme.qss'), 'r', encoding='utf-8') as file:
+                entry['stylesheet'] = file.read()
+            return entry
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error loading cached stylesheet: {e}")
+            return None
+
+    def save(self, variant_dir: str, key: str, stylesheet: str, entry: dict):
+        """Writes the stylesheet first and the entry last, so a partial write is never used."""
+        try:
+            with open(os.path.join(variant_dir, 'theme.qss'), 'w', encoding='utf-8') as file:
+                file.write(stylesheet)
+            temp_path = os.path.join(variant_dir, 'theme.json.tmp')
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump({**entry, 'key': key}, file)
+            os.replace(temp_path, os.path.join(variant_dir, 'theme.json'))
+        except OSError as e:
+            print(f"Error saving cached stylesheet: {e}")
+
+    def cache_key(self, theme: str, invert_secondary: bool) -> str:
+        """Hashes everything the rendered sheet depends on."""
+        digest = hashlib.sha256()
+        package_dir = self.package_dir()
+        digest.update(f"{CACHE_FORMAT}|{metadata.version('qt-material')}|{theme}|{invert_secondary}|{platform.system()}".encode('utf-8'))
+        theme_path = theme if os.path.exists(theme) else os.path.join(package_dir, 'themes', theme)
+        for path in (theme_path, os.path.join(package_dir, 'material.qss.template')):
+            with open(path, 'rb') as file:
+                digest.update(hashlib.sha256(file.read()).digest())
+        return digest.hexdigest()
+
+    def package_dir(self) -> str:
+        """Returns the qt_material directory without importing the package and jinja2 with it."""
+        if self._package_dir is None:
+            self._package_dir = util.find_spec('qt_material').submodule_search_locations[0]
+        return self._package_dir
+
+    @staticmethod
+    def variant_name(theme: str, invert_secondary: bool) -> str:
+        name = os.path.splitext(os.path.basename(theme))[0]
+        return f"{name}_inverted" if invert_secondary else name
+
+    def _load_fonts(self):
+        """Registers the Roboto fonts the stylesheets use, once per process."""
+        if self._fonts_loaded:
+            return
+        self._fonts_loaded = True
+        fonts_dir = os.path.join(self.package_dir(), 'fonts', 'roboto')
+        for font in sorted(os.listdir(fonts_dir)):
+            if font.endswith('.ttf'):
+                QFontDatabase.addApplicationFont(os.path.join(fonts_dir, font))
+
+    def _set_text_color(self, primary_color: str):
+        """Tints the palette text with the primary color, as qt_material does."""
+        palette = QGuiApplication.palette()
+        palette.setColor(QPalette.ColorRole.Text, QColor(*[int(primary_color[i:i + 2], 16) for i in range(1, 6, 2)], 92))
+        QGuiApplication.setPalette(palette)
+
+    def _set_icon_path(self, variant_dir: str):
+        # Replaced rather than added to, so icons of the previous theme do not shadow the new ones
+        QDir.setSearchPaths('icon', [variant_dir])
+
+stylesheet_cache = StylesheetCache()
+
+def apply_theme(app, theme: str, invert_secondary: bool = False) -> bool:
+    """Global function to apply a qt_material theme through the stylesheet cache."""
+    return stylesheet_cache.apply(app, theme, invert_secondary)
@@ -0,0 +1,136 @@
+import random
+import time
+from utils.utils import get_translated_string
+from utils.metrics import exceptions_total, metrics
+
+RECONNECT_INITIAL_DELAY = 1
+RECONNECT_MAX_DELAY = 15
+# pypresence waits up to 30 s for the pipe by default, which would hold up shutdown
+CONNECT_TIMEOUT = 5
+RESPONSE_TIMEOUT = 5
+# An idle connection is checked by sending the current state again this often
+KEEPALIVE_INTERVAL = 30
+
+discord_reconnects = metrics.counter('presence_discord_reconnects_total', 'Connections to the Discord client, after the first one.')
+
+class DiscordConnection:
+    """
+    Supervises the IPC connection to the Discord client.
+
+    Connecting retries with jittered exponential backoff until it succeeds or the stop flag
+    is set; every wait is a wait on the stop flag, so shutdown is never held up. A lost
+    connection is detected by the next update or keepalive, which drops it so the caller
+    reconnects.
+    """
+    def __init__(self, client_id: str, stop_flag, initial_delay: float = RECONNECT_INITIAL_DELAY, max_delay: float = RECONNECT_MAX_DELAY):
+        self.client_id = client_id
+        self.stop_flag = stop_flag
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self._presence = None
+        self._connections = 0
+        self._last_sent = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._presence is not None
+
+    def connect(self) -> bool:
+        """
+        Connects to Discord, retrying until it works.
+
+        Returns:
+            bool: True once connected, False if the stop flag was set first.
+        """
+        from pypresence import Presence
+
+        attempt = 0
+        while not self.stop_flag.is_set():
+            presence = Presence(self.client_id, connection_timeout=CONNECT_TIMEOUT, response_timeout=RESPONSE_TIMEOUT)
+            try:
+                presence.connect()
+            except Exception as e:
+                exceptions_total.inc('discord_connect')
+                self._discard(presence)
+                if attempt == 0:
+                    print(get_translated_string('client_connection_exception'))
+                    print(e)
+                self.stop_flag.wait(self.backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            self._presence = presence
+            self._connections += 1
+            if self._connections > 1:
+                discord_reconnects.inc()
+            print(get_translated_string('client_connected'))
+            return True
+        return False
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Returns how long to wait before the next attempt, between half and all of the capped exponential delay."""
+        delay = min(self.max_delay, self.initial_delay * 2 ** attempt)
+        return delay * random.uniform(0.5, 1)
+
+    def update(self, state: dict) -> bool:
+        """
+        Sends a presence state.
+
+        Errors Discord reports about the state itself are raised; connection errors only
+        drop the connection.
+
+        Returns:
+            bool: True if Discord received the state.
+        """
+        from pypresence.exceptions import DiscordError, ServerError
+
+        if self._presence is None:
+            return False
+
+        try:
+            self._presence.update(**state)
+        except (DiscordError, ServerError):
+            raise
+        except Exception as e:
+            exceptions_total.inc('discord_update')
+            print(get_translated_string('client_update_exception'))
+            print(e)
+            self._discard(self._presence)
+            self._presence = None
+            return False
+
+        self._last_sent = time.monotonic()
+        return True
+
+    def keepalive(self, state: dict) -> bool:
+        """
+        Sends the current state again if the connection has been idle for a while.
+
+        A Discord restart is otherwise only noticed once the state changes.
+
+        Returns:
+            bool: False if the connection turned out to be lost.
+        """
+        if self._presence is not None and time.monotonic() - self._last_sent >= KEEPALIVE_INTERVAL:
+            return self.update(state)
+        return self.connected
+
+    def close(self):
+        """Clears the presence and closes the connection, ignoring errors from a dead pipe."""
+        presence, self._presence = self._presence, None
+        if presence is None:
+            return
+        try:
+            presence.clear()
+            presence.close()
+        except Exception:
+            self._discard(presence)
+
+    def _discard(self, presence):
+        """Frees the event loop of a failed connection."""
+        try:
+            if presence.sock_writer is not None:
+                presence.sock_writer.close()
+            presence.loop.close()
+        except Exception:
+            pass
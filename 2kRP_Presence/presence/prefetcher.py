@@ -0,0 +1,170 @@
+import threading
+from collections import deque
+from shared.data import GameState
+from utils.utils import get_wiki_image_from_page, get_wiki_images
+from utils.image_cache import image_cache
+from utils.image_index import image_index
+from utils.wiki_api import wiki_api
+from utils.metrics import metrics
+from utils.constants import PREFETCH_BATCH_SIZE, PREFETCH_MAX_LINKS, PREFETCH_MAX_WORKERS, PREFETCH_REQUESTS_PER_MINUTE
+from presence.scheduler import TokenBucket
+
+prefetched_pages = metrics.counter('presence_prefetch_pages_total', 'Wiki pages handled by the prefetcher, by result.', ('result',))
+
+class WikiPrefetcher:
+    """
+    Resolves the images of the rooms linked from the current room page ahead of time.
+
+    Whenever the player enters a room whose page is known, the pages linked from its infobox
+    are queued and fetched into the image cache in the background, so the next room change
+    usually finds its image already cached. Entering another room replaces the queue. The
+    prefetcher is deliberately modest: at most 'max_workers' pages are fetched at once and
+    at most 'requests_per_minute' per minute, and pages already in the cache or the
+    offline index are skipped. While the wiki API is available, up to 'batch_size' pages
+    are resolved with a single request instead, and the pages it cannot resolve are queued
+    again to be fetched one at a time.
+
+    The API does not know the infobox links, so when the current page was resolved through
+    it, its HTML page is fetched first and its links are queued once they are known.
+    """
+    def __init__(self, max_workers: int = PREFETCH_MAX_WORKERS, requests_per_minute: int = PREFETCH_REQUESTS_PER_MINUTE, max_links: int = PREFETCH_MAX_LINKS, batch_size: int = PREFETCH_BATCH_SIZE):
+        self.max_workers = max_workers
+        self.max_links = max_links
+        self.batch_size = batch_size
+        self.budget = TokenBucket(requests_per_minute, 60)
+        self._queue = deque()
+        # Pages the API could not resolve, fetched one at a time
+        self._page_only = set()
+        # Current page whose links must be read from its HTML page first
+        self._links_page = None
+        # Bumped whenever the queue is replaced, so late results do not refill it
+        self._generation = 0
+        self._current_url = None
+        self._workers = []
+        self._stopping = False
+        self._condition = threading.Condition()
+
+    def on_data_changed(self, snapshot: GameState):
+        """DataStore listener: queues the neighbours of the room the player is in."""
+        if snapshot.wiki_page_url != self._current_url:
+            self._current_url = snapshot.wiki_page_url
+            self.prefetch_links(snapshot.wiki_page_url)
+
+    def on_page_resolved(self, wiki_url: str):
+        """Image resolver listener: the current room page may only now be known."""
+        if wiki_url == self._current_url:
+            self.prefetch_links(wiki_url)
+
+    def prefetch_links(self, wiki_url: str):
+        """Replaces the queue with the uncached pages linked from the given page, if it is cached."""
+        entry = image_cache.get_stale(wiki_url) if wiki_url else None
+        links_unknown = entry is not None and entry.get('links') is None
+        limit = self.batch_size if wiki_api.is_available(wiki_url) else self.max_links
+        links = [
+            link for link in (entry.get('links') or [])[:limit]
+            if link != wiki_url and not image_cache.is_fresh(link) and not image_index.contains_page(link)
+        ] if entry else []
+
+        with self._condition:
+            if self._stopping:
+                return
+            self._generation += 1
+            self._queue.clear()
+            self._page_only.clear()
+            self._queue.extend(links)
+            self._links_page = wiki_url if links_unknown else None
+            if links or links_unknown:
+                self._start_workers()
+                self._condition.notify_all()
+
+    def shutdown(self):
+        """Drops the queue and lets the workers exit after their current page."""
+        with self._condition:
+            self._stopping = True
+            self._queue.clear()
+            self._condition.notify_all()
+
+    def _start_workers(self):
+        """Starts the worker threads on first use. Must hold the condition."""
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._work, name=f'wiki-prefetch-{len(self._workers)}', daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _next_batch(self):
+        """
+        Waits for queued pages and a request token. Returns None when shutting down.
+
+        Returns:
+            tuple: (generation, pages, kind). Kind is 'links' for the current page whose
+            links are unknown, 'api' for up to 'batch_size' pages the wiki API may resolve
+            with one request, or 'page' for a single page fetched from its HTML page.
+        """
+        with self._condition:
+            while not self._stopping:
+                while self._queue and image_cache.is_fresh(self._queue[0]):
+                    # Resolved meanwhile, e.g. because the player already went there
+                    self._queue.popleft()
+                    prefetched_pages.inc('cached')
+                if not self._queue and self._links_page is None:
+                    self._condition.wait()
+                    continue
+                delay = self.budget.time_until_available()
+                if delay > 0:
+                    # The queue may be replaced meanwhile, so check it again after waiting
+                    self._condition.wait(delay)
+                    continue
+                if self.budget.try_acquire():
+                    if self._links_page is not None:
+                        links_page, self._links_page = self._links_page, None
+                        return self._generation, [links_page], 'links'
+                    if self._queue[0] in self._page_only or not wiki_api.is_available(self._queue[0]):
+                        return self._generation, [self._queue.popleft()], 'page'
+                    batch = []
+                    while self._queue and len(batch) < self.batch_size and self._queue[0] not in self._page_only:
+                        link = self._queue.popleft()
+                        if image_cache.is_fresh(link):
+                            prefetched_pages.inc('cached')
+                        else:
+                            batch.append(link)
+                    return self._generation, batch, 'api'
+            return None
+
+    def _requeue(self, generation: int, pages: list):
+        """Queues the pages the API could not resolve again, ahead of the rest, to be fetched one at a time."""
+        with self._condition:
+            if self._stopping or generation != self._generation:
+                prefetched_pages.inc('skipped', amount=len(pages))
+                return
+            self._page_only.update(pages)
+            self._queue.extendleft(reversed(pages))
+            self._condition.notify_all()
+
+    def _work(self):
+        while True:
+            task = self._next_batch()
+            if task is None:
+                return
+            generation, batch, kind = task
+            try:
+                if kind == 'api':
+                    # API batches only take what the API answers, so they never turn into a burst of page fetches
+                    images = get_wiki_images(batch, fallback=False)
+                    prefetched_pages.inc('fetched', amount=len(images))
+                    misses = [link for link in batch if link not in images]
+                    if misses:
+                        self._requeue(generation, misses)
+                    continue
+
+                get_wiki_image_from_page(batch[0])
+                prefetched_pages.inc('fetched')
+                if kind == 'links' and generation == self._generation:
+                    entry = image_cache.get_stale(batch[0])
+                    # Unless the fetch failed, the links of the current page can now be queued
+                    if entry is not None and entry.get('links') is not None:
+                        self.prefetch_links(batch[0])
+            except Exception as e:
+                prefetched_pages.inc('error', amount=len(batch))
+                print(f"Error prefetching wiki page: {e}")
+
+wiki_prefetcher = WikiPrefetcher()
@@ -1,109 +1,152 @@
 import time
-from pypresence import Presence
-from shared.data import get_data
-from utils.utils import replace_patterns, get_wiki_image, get_translated_string
-from app_context import get_main_window
+from shared.data import GameState, get_data, subscribe
+from shared.events import publish_event
+from shared.settings import get_presence_settings, subscribe_presence_settings
+from utils.constants import PRESENCE_IMAGE_BUDGET, game_type_mappings
+from utils.utils import get_translated_string
+from utils.translations import translator
+from utils.templates import TemplateRenderer
+from utils.startup import startup_timer
+from utils.memory import add_memory_releaser
+from utils.metrics import exceptions_total, metrics
+from utils.image_index import image_index
+from utils.image_cache import image_cache
+from utils.wiki_worker import wiki_worker
+from presence.resolver import image_resolver
+from presence.scheduler import presence_scheduler
+from presence.discord_client import DiscordConnection
+from presence.prefetcher import wiki_prefetcher
 
 CLIENT_ID = '1246902701535793324'
 PLACEHOLDER_IMAGE = 'https://i.imgur.com/TN8WK7E.png'
 HUB_IMAGE = 'https://static.wikia.nocookie.net/yumenikki/images/9/9c/The_Nexus.png/revision/latest?cb=20110725075611'
 start_time = time.time()
-main_window = None
-
-game_type_mappings = {
-    '2kki': 'Yume 2kki',
-    'amillusion': 'Amillusion',
-    'braingirl': 'Braingirl',
-    'deepdreams': 'Deep Dreams',
-    'flow': '.flow',
-    'fog': 'Fog',
-    'genie': 'Dream Genie',
-    'if': 'If',
-    'mikan': 'Mikan Muzou',
-    'muma': 'Muma Rope',
-    'nostalgic': 'nostAlgic',
-    'oneshot': 'Oneshot',
-    'oversomnia': 'Oversomnia',
-    'prayers': 'Answered Prayers',
-    'sheawaits': 'She Awaits',
-    'someday': 'Someday',
-    'tsushin': 'Yume Tsushin',
-    'unaccomplished': 'Unaccomplished',
-    'unconscious': 'Collective Unconscious',
-    'ultraviolet': 'Ultra Violet',
-    'unevendream': 'Uneven Dream',
-    'yume': 'Yume Nikki'
-}
-
-def get_image_url(image_option: str, wiki_page_url: str, badge_image_url: str, custom_image_url: str) -> str:
+last_presence = None
+image_budget = PRESENCE_IMAGE_BUDGET
+budget_spent_on = None
+
+discord_updates_sent = metrics.counter('presence_discord_updates_sent_total', 'Presence updates sent to Discord.')
+discord_updates_skipped = metrics.counter('presence_discord_updates_skipped_total', 'Presence loop wake-ups that sent nothing, by reason.', ('reason',))
+images_deferred = metrics.counter('presence_images_deferred_total', 'Room images that missed the latency budget and followed in a later update.')
+tick_seconds = metrics.histogram('presence_tick_seconds', 'Time spent building and sending the presence per loop iteration.')
+
+def set_image_budget(seconds: float):
+    """Sets how long a presence update may wait for the room image before it is sent without it."""
+    global image_budget
+    image_budget = max(0.0, seconds)
+
+def get_room_image(game_data: GameState, deadline: float) -> str:
+    """
+    Returns the image of the current room, waiting for it at most until 'deadline'.
+
+    The budget is only spent once per room. When the image misses it, the image the page had
+    last time is used, if any; the resolver wakes the loop once it arrives, which sends the
+    follow-up update.
+    """
+    global budget_spent_on
+
+    # Well-known rooms come from the offline index, which also covers rooms without a wiki link
+    wiki_image = image_index.lookup(game_data.wiki_page_url, game_data.game_type, game_data.location)
+    if wiki_image is not None:
+        return wiki_image
+
+    wiki_page_url = game_data.wiki_page_url
+    done, wiki_image = image_resolver.resolve(wiki_page_url)
+    if not done and wiki_page_url != budget_spent_on:
+        budget_spent_on = wiki_page_url
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            done, wiki_image = image_resolver.wait(wiki_page_url, remaining)
+        if not done:
+            # Counted once per room, not on every later tick until the image arrives
+            images_deferred.inc()
+    if not done:
+        stale = image_cache.get_stale(wiki_page_url)
+        wiki_image = stale['image_url'] if stale else None
+    return wiki_image
+
+def get_image_url(image_option: str, game_data: GameState, custom_image_url: str, deadline: float = 0) -> str:
     """Returns the image URL based on the specified option."""
     if image_option == 'use_current_room':
-        wiki_image = get_wiki_image(wiki_page_url)
+        wiki_image = get_room_image(game_data, deadline)
         return wiki_image if wiki_image else PLACEHOLDER_IMAGE
     elif image_option == 'use_badge':
-        return badge_image_url or PLACEHOLDER_IMAGE
+        return game_data.badge_image_url or PLACEHOLDER_IMAGE
     else:
         return custom_image_url
 
 def get_plural_suffix(count):
     """Returns the plural suffix based on the current language setting."""
-    with open('language.txt', 'r', encoding='utf-8') as f:
-        language_code = f.read().strip()
-    
-    plural_suffixes = {
-        'en': 's',
-        'pt_br': 'es'
-    }
-    
-    suffix = plural_suffixes.get(language_code, 's')
-    
-    return '' if count <= 1 else suffix
+    return translator.plural_suffix(count)
 
 def format_player_count(player_count):
     entity = get_translated_string('presence_player_entity')
     suffix = get_plural_suffix(player_count)
     return f"{player_count} {entity}{suffix}"
 
+def format_location(location):
+    return location or get_translated_string('presence_no_location')
+
+def format_game_type(game_type):
+    return game_type_mappings.get(game_type, game_type)
+
+# Placeholders available in the presence templates: name -> (game data fields, resolver)
+presence_templates = TemplateRenderer({
+    'location': (('location',), format_location),
+    'playersonline': (('players_online',), format_player_count),
+    'playersonmap': (('players_on_map',), format_player_count),
+    'gametype': (('game_type',), format_game_type)
+})
+add_memory_releaser(presence_templates.clear)
+
+def find_unknown_placeholders(text: str) -> list:
+    """Returns the placeholders in a presence template that cannot be replaced."""
+    return presence_templates.find_unknown(text)
+
 def fetch_presence_data():
     """Fetches the game data and prepares the presence information."""
-    global main_window
     global start_time
+    global last_presence
     
     game_data = get_data()
-    main_window = get_main_window()
-    
-    try:
-        game_type = game_data['game_type']
-        location = game_data['location']
-        badge_image_url = game_data['badge_image_url']
-        players_online = game_data['players_online']
-        players_on_map = game_data['players_on_map']
-        wiki_page_url = game_data['wiki_page_url']
-    except (KeyError, TypeError):
-        return {'state': get_translated_string('presence_loading_game')}
+    settings = get_presence_settings()
+    game_type = game_data.game_type
+    wiki_page_url = game_data.wiki_page_url
     
     if game_type is None:
         start_time = time.time()
         return {'state': get_translated_string('presence_picking_game'), 'large_image': HUB_IMAGE}
     
-    game_type_full = game_type_mappings.get(game_type, game_type)
-
-    default_replacements = {
-        'location': location or get_translated_string('presence_no_location'),
-        'playersonline': format_player_count(players_online),
-        'playersonmap': format_player_count(players_on_map),
-        'gametype': game_type_full
+    image_resolver.cancel_stale({wiki_page_url})
+    # Both images share one budget, so the texts never wait longer than it on the wiki
+    deadline = time.monotonic() + image_budget
+    large_image = get_image_url(settings.large_image, game_data, settings.large_image_url, deadline)
+    small_image = get_image_url(settings.small_image, game_data, settings.small_image_url, deadline)
+    
+    # Nothing to render again if neither the data version, the settings nor the images changed
+    render_key = (game_data.version, settings, translator.get_language(), large_image, small_image)
+    if last_presence is not None and last_presence[0] == render_key:
+        return last_presence[1]
+    
+    template_inputs = {
+        'game_type': game_type,
+        'location': game_data.location,
+        'players_online': game_data.players_online,
+        'players_on_map': game_data.players_on_map
     }
+    # Rendered texts depend on the language through the translated placeholders
+    template_context = (translator.get_language(),)
+
+    def render(template):
+        return presence_templates.render(template, template_inputs, template_context)
     
-    # Presence text and image configuration
-    details_text = replace_patterns(main_window.settings.value('presence/details', '', type=str), default_replacements)
-    state_text = replace_patterns(main_window.settings.value('presence/state', '', type=str), default_replacements)
-    large_image = get_image_url(main_window.settings.value('presence/large_image', '', type=str), wiki_page_url, badge_image_url, main_window.settings.value('large_custom_image_url', '', type=str))
-    large_image_text = replace_patterns(main_window.settings.value('presence/large_image_text', '', type=str), default_replacements)
-    small_image = get_image_url(main_window.settings.value('presence/small_image', '', type=str), wiki_page_url, badge_image_url, main_window.settings.value('small_custom_image_url', '', type=str))
-    small_image_text = replace_patterns(main_window.settings.value('presence/small_image_text', '', type=str), default_replacements)
+    # Presence text configuration
+    details_text = render(settings.details)
+    state_text = render(settings.state)
+    large_image_text = render(settings.large_image_text)
+    small_image_text = render(settings.small_image_text)
     
-    return {
+    presence_data = {
         'details': details_text,
         'state': state_text,
         'large_image': large_image,
@@ -112,6 +155,12 @@ def fetch_presence_data():
         'small_text': small_image_text,
         'start': start_time
     }
+    last_presence = (render_key, presence_data)
+    return presence_data
+
+def wake_presence():
+    """Wakes up the presence loop, e.g. so it notices the stop flag immediately."""
+    presence_scheduler.notify()
 
 def run_presence(stop_flag):
     """
@@ -120,30 +169,60 @@ def run_presence(stop_flag):
     Args:
         stop_flag (threading.Event): Event to signal when to stop the loop.
     """
-    presence = Presence(CLIENT_ID)
-    try:
-        presence.connect()
-        print(get_translated_string('client_connected'))
-    except Exception as e:
-        print(get_translated_string('client_connection_exception'))
-        time.sleep(30)
-        return
+    connection = DiscordConnection(CLIENT_ID, stop_flag)
+    if connection.connect():
+        startup_timer.mark('discord_connect')
 
     previous_state = None
+    # Render again whenever the game data or settings change, or a room image finishes resolving
+    subscribe(presence_scheduler.notify)
+    subscribe_presence_settings(presence_scheduler.notify)
+    image_resolver.add_listener(presence_scheduler.notify)
+    # Resolve the rooms next to the current one in the background
+    subscribe(wiki_prefetcher.on_data_changed)
+    image_resolver.add_listener(wiki_prefetcher.on_page_resolved)
+    rate_limit = presence_scheduler.rate_limit
 
     while not stop_flag.is_set():
+        if not connection.connected:
+            # Reconnect with backoff after Discord went away; only the latest state is sent afterwards
+            if not connection.connect():
+                break
+            previous_state = None
         try:
+            tick_start = time.perf_counter()
             current_state = fetch_presence_data()
             if current_state != previous_state:
-                presence.update(**current_state)
+                delay = rate_limit.time_until_available()
+                if delay > 0:
+                    # Out of update budget, wait for it and send whatever is latest by then
+                    discord_updates_skipped.inc('rate_limited')
+                    tick_seconds.observe(time.perf_counter() - tick_start)
+                    presence_scheduler.wait(delay)
+                    continue
+                rate_limit.try_acquire()
                 previous_state = current_state
-            time.sleep(15)
+                if not connection.update(current_state):
+                    discord_updates_skipped.inc('disconnected')
+                    continue
+                discord_updates_sent.inc()
+                startup_timer.finish('first_presence')
+                publish_event('presence', {'details': current_state.get('details'), 'state': current_state.get('state')})
+            else:
+                discord_updates_skipped.inc('unchanged')
+                if not connection.keepalive(current_state):
+                    continue
+            tick_seconds.observe(time.perf_counter() - tick_start)
+            presence_scheduler.wait()
         except Exception as e:
+            exceptions_total.inc('presence_loop')
             print(get_translated_string('client_update_exception'))
             print(e)
-            time.sleep(15)
+            stop_flag.wait(15)
     
+    image_resolver.shutdown()
+    wiki_prefetcher.shutdown()
+    wiki_worker.shutdown()
     print(get_translated_string('client_disconnect'))
-    presence.clear()
-    presence.close()
+    connection.close()
     exit(0)
\ No newline at end of file
@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from utils.utils import get_wiki_image
+from utils.image_cache import image_cache
+from utils.memory import add_memory_releaser
+from utils.metrics import exceptions_total
+
+class ImageResolver:
+    """
+    Resolves wiki room images in background threads so the presence loop never waits on the network.
+
+    Concurrent requests for the same wiki page share a single future, the number of queued
+    jobs is bounded, and jobs for rooms the player already left can be cancelled before they run.
+    """
+    def __init__(self, max_workers: int = 2, max_pending: int = 8, retry_interval: float = 60):
+        self.max_pending = max_pending
+        self.retry_interval = retry_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-resolver')
+        self._pending = {}
+        self._completed = OrderedDict()
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, callback):
+        """Registers a callback to be called with the wiki URL whenever a job finishes."""
+        self._listeners.append(callback)
+
+    def resolve(self, wiki_url: str):
+        """
+        Returns the image for the given wiki page if it is already known, otherwise schedules a job for it.
+
+        Returns:
+            tuple: (done, image_url). 'done' is False while the image is still being resolved.
+        """
+        if not wiki_url:
+            return True, None
+
+        cached = image_cache.get_fresh(wiki_url)
+        if cached is not None:
+            return True, cached['image_url']
+
+        with self._lock:
+            completed = self._completed.get(wiki_url)
+            if completed is not None and time.time() - completed[1] < self.retry_interval:
+                return True, completed[0]
+
+            if wiki_url in self._pending or len(self._pending) >= self.max_pending:
+                return False, None
+            future = self._executor.submit(get_wiki_image, wiki_url)
+            self._pending[wiki_url] = future
+
+        future.add_done_callback(lambda f: self._on_done(wiki_url, f))
+        return False, None
+
+    def wait(self, wiki_url: str, timeout: float = None):
+        """
+        Waits up to 'timeout' seconds for a pending job to finish.
+
+        Returns:
+            tuple: (done, image_url), same as resolve().
+        """
+        with self._lock:
+            future = self._pending.get(wiki_url)
+
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+        return self.resolve(wiki_url)
+
+    def cancel_stale(self, current_urls):
+        """Cancels every queued job whose wiki URL is not in 'current_urls'."""
+        with self._lock:
+            stale = [(url, future) for url, future in self._pending.items() if url not in current_urls]
+
+        for url, future in stale:
+            future.cancel()
+
+    def forget_completed(self):
+        """Drops the results of finished jobs; the image cache still answers for successful ones."""
+        with self._lock:
+            self._completed.clear()
+
+    def shutdown(self):
+        """Cancels queued jobs and stops the worker threads."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _on_done(self, wiki_url, future):
+        with self._lock:
+            if self._pending.get(wiki_url) is future:
+                del self._pending[wiki_url]
+            if not future.cancelled():
+                try:
+                    result = future.result()
+                except Exception as e:
+                    exceptions_total.inc('image_resolver')
+                    print(f"Error resolving wiki image: {e}")
+                    result = None
+                self._completed[wiki_url] = (result, time.time())
+                self._completed.move_to_end(wiki_url)
+                while len(self._completed) > self.max_pending * 4:
+                    self._completed.popitem(last=False)
+
+        if future.cancelled():
+            return
+
+        for callback in self._listeners:
+            callback(wiki_url)
+
+image_resolver = ImageResolver()
+add_memory_releaser(image_resolver.forget_completed)
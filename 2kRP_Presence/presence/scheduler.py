@@ -0,0 +1,77 @@
+import threading
+import time
+
+# Discord accepts at most 5 presence updates every 20 seconds
+DISCORD_UPDATE_LIMIT = 5
+DISCORD_UPDATE_PERIOD = 20
+# How long a burst of notifications may keep the loop settling before it renders
+COALESCE_WINDOW = 0.1
+# Fallback refresh interval when nothing notifies the loop
+IDLE_INTERVAL = 15
+
+class TokenBucket:
+    """Token bucket holding up to 'capacity' tokens, refilled evenly over 'period' seconds."""
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self) -> bool:
+        """Takes a token if one is available."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def time_until_available(self) -> float:
+        """Returns how many seconds until a token can be taken, 0 if one is available now."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+class PresenceScheduler:
+    """
+    Wakes the presence loop when something it renders has changed.
+
+    Data changes, resolved images and shutdown all call notify(); the loop sleeps in wait()
+    and only falls back to polling every IDLE_INTERVAL seconds.
+    """
+    def __init__(self, update_limit: int = DISCORD_UPDATE_LIMIT, update_period: float = DISCORD_UPDATE_PERIOD):
+        self.rate_limit = TokenBucket(update_limit, update_period)
+        self._event = threading.Event()
+
+    def notify(self, *args):
+        """Wakes up the presence loop. Accepts and ignores any listener arguments."""
+        self._event.set()
+
+    def wait(self, timeout: float = IDLE_INTERVAL) -> bool:
+        """
+        Sleeps until notified or until 'timeout' seconds have passed.
+
+        Returns:
+            bool: True if the loop was notified.
+        """
+        notified = self._event.wait(timeout)
+        self._event.clear()
+        if notified:
+            self._settle()
+        return notified
+
+    def _settle(self):
+        """Lets a burst of notifications die down so only the latest state gets rendered."""
+        deadline = time.monotonic() + COALESCE_WINDOW * 4
+        while time.monotonic() < deadline and self._event.wait(COALESCE_WINDOW):
+            self._event.clear()
+
+presence_scheduler = PresenceScheduler()
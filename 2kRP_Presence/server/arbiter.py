@@ -0,0 +1,132 @@
+import threading
+import time
+from shared.data import update_data
+from utils.metrics import metrics
+
+DEFAULT_SOURCE = 'default'
+# Sources that stop reporting (closed tabs) lose their say after this many seconds; open
+# tabs send an empty update at least every 10 seconds even when nothing changed
+SOURCE_TIMEOUT = 20
+# How long a room without a location (a map still loading) is held back
+TRANSIENT_HOLD = 3
+# Fields whose change makes a source the most recently changed one; player counts and
+# badges change on their own in background tabs
+ACTIVITY_FIELDS = ('game_type', 'location', 'wiki_page_url')
+
+ingest_suppressed = metrics.counter('presence_ingest_suppressed_total', 'Reported states kept from the presence loop, by reason.', ('reason',))
+
+class Source:
+    """Latest state reported by one extension client, usually a browser tab."""
+    __slots__ = ('fields', 'focused', 'focused_at', 'changed_at', 'seen_at', 'transient_since')
+
+    def __init__(self, fields: dict, now: float):
+        self.fields = fields
+        self.focused = False
+        self.focused_at = 0
+        self.changed_at = now
+        self.seen_at = now
+        self.transient_since = None
+
+    def is_transient(self) -> bool:
+        return self.fields.get('game_type') is not None and self.fields.get('location') is None
+
+class SourceArbiter:
+    """
+    Chooses which extension client drives the presence.
+
+    Every tab running the extension reports its own state. The active source is the most
+    recently focused tab among the focused ones, otherwise the one whose room changed last,
+    and only its state reaches the DataStore. States without a location, which tabs report
+    while a map loads, are held back for TRANSIENT_HOLD seconds so the presence does not
+    flap to "no location" and back.
+    """
+    def __init__(self, source_timeout: float = SOURCE_TIMEOUT, transient_hold: float = TRANSIENT_HOLD):
+        self.source_timeout = source_timeout
+        self.transient_hold = transient_hold
+        self.active = None
+        self._sources = {}
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def report(self, client_id: str, fields: dict, focused: bool = None) -> bool:
+        """
+        Records the full state reported by a client and publishes the winning state.
+
+        Args:
+            client_id (str): The reporting client, DEFAULT_SOURCE for clients that do not send one.
+            fields (dict): DataStore fields without the version.
+            focused (bool): Whether the reporting tab has focus, None if unknown.
+
+        Returns:
+            bool: True if the published game data changed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            source = self._sources.get(client_id)
+            if source is None:
+                source = self._sources[client_id] = Source(fields, now)
+            elif any(source.fields.get(field) != fields.get(field) for field in ACTIVITY_FIELDS):
+                source.changed_at = now
+            source.fields = fields
+            source.seen_at = now
+
+            if focused and not source.focused:
+                source.focused_at = now
+            source.focused = bool(focused)
+
+            if source.is_transient():
+                if source.transient_since is None:
+                    source.transient_since = now
+            else:
+                source.transient_since = None
+
+            return self._publish(now, client_id)
+
+    def get_fields(self, client_id: str):
+        """Returns the last state reported by a client, or None if it is unknown."""
+        source = self._sources.get(client_id)
+        return dict(source.fields) if source is not None else None
+
+    def _select(self, now: float):
+        """Returns the id of the active source. Must hold the lock."""
+        for client_id, source in list(self._sources.items()):
+            if now - source.seen_at > self.source_timeout:
+                del self._sources[client_id]
+        if not self._sources:
+            return None
+
+        focused = [item for item in self._sources.items() if item[1].focused]
+        candidates = focused or self._sources.items()
+        return max(candidates, key=lambda item: max(item[1].focused_at, item[1].changed_at))[0]
+
+    def _publish(self, now: float, reporter: str = None) -> bool:
+        """Publishes the state of the active source unless it is transient. Must hold the lock."""
+        self.active = self._select(now)
+        if self.active is None:
+            return False
+        if reporter is not None and reporter != self.active:
+            ingest_suppressed.inc('inactive_source')
+
+        source = self._sources[self.active]
+        if source.transient_since is not None:
+            remaining = source.transient_since + self.transient_hold - now
+            if remaining > 0:
+                ingest_suppressed.inc('transient')
+                self._schedule(remaining)
+                return False
+        return update_data(**source.fields)
+
+    def _schedule(self, delay: float):
+        """Evaluates the sources again once a held back state may be published. Must hold the lock."""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._reevaluate)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _reevaluate(self):
+        with self._lock:
+            self._timer = None
+            self._publish(time.monotonic())
+
+source_arbiter = SourceArbiter()
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import queue
+import threading
+from http import HTTPStatus
+from urllib.parse import parse_qsl
+from shared.events import HEARTBEAT_INTERVAL, event_channel, format_event
+from server.handlers import ROUTES
+
+MAX_REQUEST_LINE = 8 * 1024
+MAX_HEADERS = 64
+MAX_BODY_SIZE = 64 * 1024
+KEEP_ALIVE_TIMEOUT = 15
+SHUTDOWN_TIMEOUT = 2
+
+class HTTPError(Exception):
+    """Error that is answered with the given status code before closing the connection."""
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class AsyncHTTPServer:
+    """
+    Small asyncio HTTP/1.1 server for the extension endpoints.
+
+    It serves the routes in server.handlers plus the '/events' stream, keeps connections
+    alive between requests, rejects bodies larger than 'max_body_size' and, on shutdown,
+    gives open connections at most 'shutdown_timeout' seconds before cancelling them.
+    """
+    def __init__(self, host: str, port: int, max_body_size: int = MAX_BODY_SIZE, shutdown_timeout: float = SHUTDOWN_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.max_body_size = max_body_size
+        self.shutdown_timeout = shutdown_timeout
+        self.loop = None
+        self._server = None
+        self._clients = set()
+        self._stopping = None
+
+    async def start(self):
+        """Starts listening. The bound port is available in 'port' afterwards."""
+        self.loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port, limit=MAX_REQUEST_LINE)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_until_stopped(self):
+        await self._stopping.wait()
+
+        self._server.close()
+        if self._clients:
+            _, pending = await asyncio.wait(self._clients, timeout=self.shutdown_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        await self._server.wait_closed()
+
+    def stop(self):
+        """Asks the server to stop. Safe to call from any thread."""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._stopping.set)
+
+    async def _handle_client(self, reader, writer):
+        task = asyncio.current_task()
+        self._clients.add(task)
+        try:
+            while not self._stopping.is_set():
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except HTTPError as e:
+                    await self._send(writer, e.status, {"status": "error", "message": str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+
+                method, target, headers, body = request
+                path, _, query = target.partition('?')
+                keep_alive = self._wants_keep_alive(headers) and not self._stopping.is_set()
+                if method == 'GET' and path == '/events':
+                    await self._stream_events(writer)
+                    break
+
+                payload, status, *content_type = self._dispatch(method, path, query, body)
+                await self._send(writer, status, payload, keep_alive, *content_type)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._clients.discard(task)
+            writer.close()
+
+    async def _read_request(self, reader):
+        """Reads one request. Returns None when the client closed the connection."""
+        request_line = await self._read_line(reader, HTTPStatus.REQUEST_URI_TOO_LONG, "Request line too long")
+        if not request_line:
+            return None
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+        headers = {'_version': version}
+        for _ in range(MAX_HEADERS + 1):
+            line = await self._read_line(reader, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Header line too long")
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Too many headers")
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise HTTPError(HTTPStatus.LENGTH_REQUIRED, "Chunked bodies are not supported")
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        if length < 0:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        if length > self.max_body_size:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target, headers, body
+
+    @staticmethod
+    async def _read_line(reader, status, message):
+        """Reads a line, answering 'status' when it is longer than the MAX_REQUEST_LINE stream limit."""
+        try:
+            return await reader.readline()
+        except (ValueError, asyncio.LimitOverrunError):
+            raise HTTPError(status, message)
+
+    def _wants_keep_alive(self, headers) -> bool:
+        connection = headers.get('connection', '').lower()
+        if headers['_version'] == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+    def _dispatch(self, method, path, query, body):
+        handler = ROUTES.get((method, path))
+        if handler is None:
+            if any(route_path == path for _, route_path in ROUTES):
+                return {"status": "error", "message": "Method not allowed"}, HTTPStatus.METHOD_NOT_ALLOWED
+            return {"status": "error", "message": "Not found"}, HTTPStatus.NOT_FOUND
+
+        # GET handlers receive the query parameters in place of a body
+        data = dict(parse_qsl(query)) if query else None
+        if method == 'POST':
+            try:
+                data = json.loads(body) if body else None
+            except ValueError as e:
+                return {"status": "error", "message": f"Failed to decode JSON object: {e}"}, HTTPStatus.BAD_REQUEST
+        return handler(data)
+
+    async def _send(self, writer, status, payload, keep_alive, content_type=None):
+        if isinstance(payload, dict):
+            body = json.dumps(payload).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            body = str(payload).encode('utf-8')
+            content_type = content_type or 'text/html; charset=utf-8'
+
+        head = (
+            f"HTTP/1.1 {int(status)} {HTTPStatus(status).phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def _stream_events(self, writer):
+        wakeup = asyncio.Event()
+        events = event_channel.subscribe(notify=lambda: self.loop.call_soon_threadsafe(wakeup.set))
+        try:
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n"
+            )
+            writer.write(format_event('hello', {'status': 'connected'}).encode('utf-8'))
+            await writer.drain()
+
+            while not self._stopping.is_set():
+                try:
+                    await asyncio.wait_for(wakeup.wait(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    writer.write(b": heartbeat\n\n")
+                wakeup.clear()
+                while True:
+                    try:
+                        writer.write(events.get_nowait().encode('utf-8'))
+                    except queue.Empty:
+                        break
+                await writer.drain()
+        finally:
+            event_channel.unsubscribe(events)
+
+class AsyncServerThread(threading.Thread):
+    """Thread running an AsyncHTTPServer on its own event loop."""
+    def __init__(self, host: str, port: int, **kwargs):
+        super().__init__(name='async-server')
+        self.server = AsyncHTTPServer(host, port, **kwargs)
+        self.ready = threading.Event()
+
+    def run(self):
+        asyncio.run(self._main())
+
+    async def _main(self):
+        try:
+            await self.server.start()
+        finally:
+            self.ready.set()
+        await self.server.serve_until_stopped()
+
+    def shutdown(self):
+        self.ready.wait()
+        self.server.stop()
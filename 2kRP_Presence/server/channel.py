@@ -0,0 +1,53 @@
+import threading
+from shared.data import GameState
+from server.arbiter import DEFAULT_SOURCE, source_arbiter
+
+# Extension payload keys and the matching DataStore fields
+PAYLOAD_FIELDS = (
+    ('gameType', 'game_type'),
+    ('location', 'location'),
+    ('badgeImageUrl', 'badge_image_url'),
+    ('playersOnline', 'players_online'),
+    ('playersOnMap', 'players_on_map'),
+    ('wikiPageUrl', 'wiki_page_url'),
+)
+
+def payload_to_fields(payload: dict) -> dict:
+    """Maps the extension payload keys to DataStore fields, ignoring unknown keys."""
+    return {field: payload.get(key) for key, field in PAYLOAD_FIELDS if key in payload}
+
+class DeltaIngest:
+    """
+    Applies the changed-fields updates sent by the extension over the channel.
+
+    Every client (browser tab) has its own sequence numbers; a full update resets the client
+    state, while a delta is only applied on top of the previous sequence number of the same
+    client. On a gap the extension is asked to send its full state again. The resulting client
+    states go through the source arbiter, which decides what reaches the DataStore.
+    """
+    def __init__(self):
+        self._seqs = {}
+        self._lock = threading.Lock()
+
+    def apply(self, seq: int, changes: dict, full: bool = False, client_id: str = DEFAULT_SOURCE, focused: bool = None):
+        """
+        Applies an update from the extension.
+
+        Returns:
+            tuple: (accepted, changed). 'accepted' is False when a resync is needed.
+        """
+        with self._lock:
+            base = None
+            if full:
+                base = GameState()._asdict()
+                del base['version']
+            elif self._seqs.get(client_id) is not None and seq == self._seqs[client_id] + 1:
+                base = source_arbiter.get_fields(client_id)
+            if base is None:
+                return False, False
+
+            base.update(payload_to_fields(changes))
+            self._seqs[client_id] = seq
+            return True, source_arbiter.report(client_id, base, focused)
+
+delta_ingest = DeltaIngest()
@@ -0,0 +1,87 @@
+from shared.events import publish_event
+from shared.data import get_data
+from shared.session_log import get_session_stats
+from server.arbiter import DEFAULT_SOURCE, source_arbiter
+from server.channel import PAYLOAD_FIELDS, delta_ingest
+from server.recorder import payload_recorder
+from utils.memory import take_memory_snapshot
+from utils.metrics import exceptions_total, metrics, render_metrics
+
+# Framework independent route handlers shared by every server backend. Each one receives the
+# decoded JSON body (None for GET requests) and returns (payload, status code), optionally
+# followed by a content type; dict payloads are sent as JSON and strings as HTML by default.
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+payloads_received = metrics.counter('presence_payloads_received_total', 'Payloads received from the extension, by route.', ('route',))
+payloads_changed = metrics.counter('presence_payloads_changed_total', 'Received payloads that changed the game state, by route.', ('route',))
+
+def receive_data(data):
+    """Receive data from the 2kki client extension and update the datastore."""
+    payloads_received.inc('receive_from_2kki')
+    payload_recorder.record('/receive_from_2kki', data)
+    try:
+        if not data:
+            return {"status": "error", "message": "No data provided"}, 400
+
+        fields = {field: data.get(key) for key, field in PAYLOAD_FIELDS}
+        # Several tabs may report at once; the arbiter decides which one drives the presence
+        if source_arbiter.report(data.get('clientId') or DEFAULT_SOURCE, fields, data.get('focused')):
+            payloads_changed.inc('receive_from_2kki')
+        return {"status": "success"}, 200
+    except Exception as e:
+        exceptions_total.inc('receive_data')
+        return {"status": "error", "message": str(e)}, 500
+
+def receive_update(data):
+    """Receive only the changed fields from the extension, tagged with a sequence number."""
+    payloads_received.inc('update')
+    payload_recorder.record('/update', data)
+    try:
+        if not data or not isinstance(data.get('seq'), int):
+            return {"status": "error", "message": "No sequence number provided"}, 400
+
+        seq = data['seq']
+        client_id = data.get('clientId') or DEFAULT_SOURCE
+        accepted, changed = delta_ingest.apply(seq, data.get('changes') or {}, bool(data.get('full')), client_id, data.get('focused'))
+        if not accepted:
+            return {"status": "resync", "seq": seq}, 200
+        if changed:
+            payloads_changed.inc('update')
+
+        publish_event('ack', {"seq": seq, "changed": changed})
+        return {"status": "success", "seq": seq, "changed": changed}, 200
+    except Exception as e:
+        exceptions_total.inc('receive_update')
+        return {"status": "error", "message": str(e)}, 500
+
+def status_check(data=None):
+    return "Server is running", 200
+
+def metrics_export(data=None):
+    """Expose the pipeline counters and latency histograms in the Prometheus text format."""
+    return render_metrics(), 200, PROMETHEUS_CONTENT_TYPE
+
+def current_state(data=None):
+    """Return the game state driving the presence and the extension client it comes from."""
+    return {"state": get_data()._asdict(), "source": source_arbiter.active}, 200
+
+def session_history(data=None):
+    """Return the time spent per game and per location, and the latest received states."""
+    return get_session_stats(), 200
+
+def memory_report(data=None):
+    """Return the memory use of the process and its largest allocation sites by module. 'stop=1' turns the allocation tracing off afterwards."""
+    stop = (data or {}).get('stop', '') not in ('', '0')
+    return take_memory_snapshot(stop), 200
+
+# (method, path) -> handler, for backends that dispatch requests themselves
+ROUTES = {
+    ('POST', '/receive_from_2kki'): receive_data,
+    ('POST', '/update'): receive_update,
+    ('GET', '/status'): status_check,
+    ('GET', '/metrics'): metrics_export,
+    ('GET', '/state'): current_state,
+    ('GET', '/history'): session_history,
+    ('GET', '/memory'): memory_report,
+}
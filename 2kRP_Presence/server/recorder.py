@@ -0,0 +1,40 @@
+import json
+import threading
+import time
+
+class PayloadRecorder:
+    """
+    Appends the payloads received from the extension to a JSON lines file.
+
+    Each line holds the seconds since recording started, the route and the decoded body,
+    which is the format benchmarks.replay plays back. Recording is off unless started, and
+    then costs one check per request.
+    """
+    def __init__(self):
+        self._file = None
+        self._start = 0
+        self._lock = threading.Lock()
+
+    def start(self, file_path: str):
+        """Starts appending to the given file."""
+        self._file = open(file_path, 'a', encoding='utf-8')
+        self._start = time.monotonic()
+
+    def record(self, route: str, data):
+        if self._file is None:
+            return
+        line = json.dumps({'t': round(time.monotonic() - self._start, 3), 'route': route, 'body': data})
+        with self._lock:
+            try:
+                self._file.write(line + '\n')
+                self._file.flush()
+            except (OSError, ValueError) as e:
+                print(f"Error recording payload: {e}")
+
+    def close(self):
+        with self._lock:
+            file, self._file = self._file, None
+        if file is not None:
+            file.close()
+
+payload_recorder = PayloadRecorder()
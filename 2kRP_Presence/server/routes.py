@@ -1,28 +1,62 @@
-from flask import Blueprint, request, jsonify
-from shared.data import update_data
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from shared.events import event_channel
+from server import handlers
 
 bp = Blueprint('main', __name__)
 
+def respond(result):
+    """Converts a (payload, status[, content type]) result from the shared handlers into a Flask response."""
+    payload, status, *content_type = result
+    if isinstance(payload, dict):
+        return jsonify(payload), status
+    if content_type:
+        return Response(payload, status=status, content_type=content_type[0])
+    return payload, status
+
 @bp.route('/receive_from_2kki', methods=['POST'])
 def receive_data():
     """Receive data from the 2kki client extension and update the datastore."""
     try:
         data = request.json
-        if not data:
-            return jsonify({"status": "error", "message": "No data provided"}), 400
-
-        game_type = data.get('gameType')
-        location = data.get('location')
-        badge_image_url = data.get('badgeImageUrl')
-        players_online = data.get('playersOnline')
-        players_on_map = data.get('playersOnMap')
-        wiki_page_url = data.get('wikiPageUrl')
-
-        update_data(game_type, location, badge_image_url, players_online, players_on_map, wiki_page_url)
-        return jsonify({"status": "success"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
+    return respond(handlers.receive_data(data))
+
+@bp.route('/update', methods=['POST'])
+def receive_update():
+    """Receive only the changed fields from the extension, tagged with a sequence number."""
+    try:
+        data = request.json
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    return respond(handlers.receive_update(data))
+
+@bp.route('/events', methods=['GET'])
+def events():
+    """Stream acknowledgements and presence status to the extension as server-sent events."""
+    stream = event_channel.stream(event_channel.subscribe())
+    return Response(stream_with_context(stream), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
 
 @bp.route('/status', methods=['GET'])
 def status_check():
-    return "Server is running", 200
\ No newline at end of file
+    return respond(handlers.status_check())
+
+@bp.route('/metrics', methods=['GET'])
+def metrics_export():
+    """Expose the pipeline counters and latency histograms in the Prometheus text format."""
+    return respond(handlers.metrics_export())
+
+@bp.route('/state', methods=['GET'])
+def current_state():
+    """Return the game state driving the presence and the extension client it comes from."""
+    return respond(handlers.current_state())
+
+@bp.route('/history', methods=['GET'])
+def session_history():
+    """Return the time spent per game and per location, and the latest received states."""
+    return respond(handlers.session_history())
+
+@bp.route('/memory', methods=['GET'])
+def memory_report():
+    """Return the memory use of the process and its largest allocation sites by module. 'stop=1' turns the allocation tracing off afterwards."""
+    return respond(handlers.memory_report(request.args.to_dict()))
@@ -1,33 +1,91 @@
+import threading
+from typing import NamedTuple
+from utils.metrics import exceptions_total
+
+class GameState(NamedTuple):
+    """Immutable snapshot of the game data received from the extension."""
+    game_type: str = None
+    location: str = None
+    badge_image_url: str = None
+    players_online: int = 0
+    players_on_map: int = 0
+    wiki_page_url: str = None
+    version: int = 0
+
+    def same_data(self, other: 'GameState') -> bool:
+        """Compares the game data of two snapshots, ignoring their versions."""
+        return self[:-1] == other[:-1]
+
 class DataStore:
+    """
+    Holds the latest game state as a versioned, immutable snapshot.
+
+    Every update that changes the data swaps in a new snapshot with the next version, so
+    readers on other threads never see a half-updated state and can skip work when the
+    version they last handled is still current.
+    """
     def __init__(self):
-        self._data_store = {
-            'game_type': None,
-            'location': None,
-            'badge_image_url': None,
-            'players_online': 0,
-            'players_on_map': 0,
-            'wiki_page_url': None
-        }
-
-    def update_data(self, game_type: str, location: str, badge_image_url: str, players_online: int, players_on_map: int, wiki_page_url: str):
-        """Update storage data."""
-        self._data_store['game_type'] = game_type
-        self._data_store['location'] = location
-        self._data_store['badge_image_url'] = badge_image_url
-        self._data_store['players_online'] = players_online
-        self._data_store['players_on_map'] = players_on_map
-        self._data_store['wiki_page_url'] = wiki_page_url
-
-    def get_data(self):
+        self._snapshot = GameState()
+        self._condition = threading.Condition()
+        self._listeners = []
+
+    def subscribe(self, callback):
+        """Registers a callback to be called with the new snapshot whenever the stored data changes."""
+        self._listeners.append(callback)
+
+    def update_data(self, game_type: str, location: str, badge_image_url: str, players_online: int, players_on_map: int, wiki_page_url: str) -> bool:
+        """
+        Update storage data and notify the listeners if anything changed.
+
+        Returns:
+            bool: True if the new data differs from the stored one.
+        """
+        with self._condition:
+            current = self._snapshot
+            snapshot = GameState(game_type, location, badge_image_url, players_online, players_on_map, wiki_page_url, current.version + 1)
+            if snapshot.same_data(current):
+                return False
+            self._snapshot = snapshot
+            self._condition.notify_all()
+
+        # One failing listener must not keep the others from hearing about the change
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                exceptions_total.inc('data_listener')
+                print(f"Error notifying data listener: {e}")
+        return True
+
+    def get_data(self) -> GameState:
         """Get storage data."""
-        return self._data_store
+        return self._snapshot
+
+    def wait_for_version(self, version: int, timeout: float = None) -> GameState:
+        """
+        Waits until the stored snapshot is newer than 'version'.
+
+        Returns:
+            GameState: The newest snapshot, which is not newer than 'version' if the wait timed out.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._snapshot.version > version, timeout)
+            return self._snapshot
 
 data_store = DataStore()
 
-def update_data(game_type: str, location: str, badge_image_url: str, players_online: int, players_on_map: int, wiki_page_url: str):
+def update_data(game_type: str, location: str, badge_image_url: str, players_online: int, players_on_map: int, wiki_page_url: str) -> bool:
     """Global function to update data in store."""
-    data_store.update_data(game_type, location, badge_image_url, players_online, players_on_map, wiki_page_url)
+    return data_store.update_data(game_type, location, badge_image_url, players_online, players_on_map, wiki_page_url)
+
+def subscribe(callback):
+    """Global function to listen for data changes."""
+    data_store.subscribe(callback)
 
-def get_data():
+def get_data() -> GameState:
     """Global function to retrieve data."""
-    return data_store.get_data()
\ No newline at end of file
+    return data_store.get_data()
+
+def wait_for_version(version: int, timeout: float = None) -> GameState:
+    """Global function to wait for data newer than the given version."""
+    return data_store.wait_for_version(version, timeout)
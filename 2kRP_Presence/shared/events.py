@@ -0,0 +1,72 @@
+import json
+import queue
+import threading
+
+# Seconds between keep-alive comments on idle event streams
+HEARTBEAT_INTERVAL = 15
+
+class EventChannel:
+    """
+    Fan-out of server-sent events to every connected extension.
+
+    Each subscriber gets a small bounded queue; events for a subscriber that stopped
+    reading are dropped instead of blocking the publisher.
+    """
+    def __init__(self, max_queued: int = 16):
+        self.max_queued = max_queued
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, notify=None) -> queue.Queue:
+        """
+        Returns a new queue receiving every published event.
+
+        Args:
+            notify (callable): Optional callback called after each event is queued, for
+                consumers that cannot block on the queue.
+        """
+        events = queue.Queue(maxsize=self.max_queued)
+        with self._lock:
+            self._subscribers.append((events, notify))
+        return events
+
+    def unsubscribe(self, events: queue.Queue):
+        """Stops delivering events to the given queue."""
+        with self._lock:
+            self._subscribers = [subscriber for subscriber in self._subscribers if subscriber[0] is not events]
+
+    def publish(self, event: str, data: dict):
+        """Sends an event to every subscriber."""
+        message = format_event(event, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for events, notify in subscribers:
+            try:
+                events.put_nowait(message)
+            except queue.Full:
+                continue
+            if notify is not None:
+                notify()
+
+    def stream(self, events: queue.Queue):
+        """Yields the messages of a subscriber queue, with heartbeats while idle."""
+        try:
+            yield format_event('hello', {'status': 'connected'})
+            while True:
+                try:
+                    yield events.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield ': heartbeat\n\n'
+        finally:
+            self.unsubscribe(events)
+
+def format_event(event: str, data: dict) -> str:
+    """Formats an event in the text/event-stream format."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+event_channel = EventChannel()
+
+def publish_event(event: str, data: dict):
+    """Global function to push an event to the connected extensions."""
+    event_channel.publish(event, data)
@@ -0,0 +1,261 @@
+import json
+import os
+import struct
+import threading
+import time
+from collections import deque
+from shared.data import GameState, subscribe
+from utils.constants import SESSION_LOG_DIR, SESSION_LOG_FLUSH_INTERVAL, SESSION_LOG_MAX_BYTES, SESSION_LOG_MAX_FILES
+from utils.metrics import exceptions_total
+
+MAGIC = b'2KRPLOG1'
+# Record length, wall clock time, players online, players on map, then the lengths of the
+# UTF-8 game type and location that follow
+RECORD = struct.Struct('<HdIIBH')
+RECORD_LENGTH = struct.Struct('<H')
+LOG_FILE = 'session.log'
+STATS_FILE = 'session_stats.json'
+RECENT_EVENTS = 32
+MAX_COUNT = 2 ** 32 - 1
+
+def to_count(value) -> int:
+    """Turns a player count reported by the extension into an int the record can hold, 0 if it is not one."""
+    try:
+        return min(max(int(value), 0), MAX_COUNT)
+    except (TypeError, ValueError, OverflowError):
+        return 0
+
+class SessionLog:
+    """
+    Append-only history of the game states received from the extension.
+
+    Every change of the DataStore becomes one small binary record. The listener only packs
+    the record into a memory buffer and updates the running totals, both O(1), so the ingest
+    path never waits on the disk; a background thread appends the buffer every few seconds.
+    The log rotates into at most 'max_files' older files of 'max_bytes' each. Time totals per
+    game and per location are kept incrementally and saved next to the log, so queries never
+    scan it and the totals outlive the rotated files.
+    """
+    def __init__(self, directory: str = SESSION_LOG_DIR, max_bytes: int = SESSION_LOG_MAX_BYTES, max_files: int = SESSION_LOG_MAX_FILES, flush_interval: float = SESSION_LOG_FLUSH_INTERVAL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.flush_interval = flush_interval
+        self._buffer = bytearray()
+        self._games = {}
+        self._locations = {}
+        self._recent = deque(maxlen=RECENT_EVENTS)
+        self._current = None
+        self._since = None
+        self._dirty = False
+        self._stopped = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def start(self):
+        """Loads the saved totals, listens for data changes and starts the background writer."""
+        self.load_stats()
+        subscribe(self.record)
+        self._thread = threading.Thread(target=self._run, name='session-log', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Accounts the current stay, then writes the pending records and the totals."""
+        self._stopped.set()
+        with self._lock:
+            self._close_stay(time.monotonic())
+            self._current = None
+        self.flush()
+
+    def record(self, snapshot: GameState):
+        """DataStore listener: logs the new state and updates the totals."""
+        game_type = snapshot.game_type or ''
+        location = snapshot.location or ''
+        encoded_game = game_type.encode('utf-8')[:255]
+        encoded_location = location.encode('utf-8')[:4096]
+        now = time.time()
+        record = RECORD.pack(
+            RECORD.size + len(encoded_game) + len(encoded_location), now,
+            to_count(snapshot.players_online), to_count(snapshot.players_on_map),
+            len(encoded_game), len(encoded_location)
+        ) + encoded_game + encoded_location
+
+        with self._lock:
+            self._buffer += record
+            self._dirty = True
+            self._recent.append((now, game_type, location, to_count(snapshot.players_online), to_count(snapshot.players_on_map)))
+            stay = (game_type, location) if game_type else None
+            if stay != self._current:
+                monotonic_now = time.monotonic()
+                self._close_stay(monotonic_now)
+                self._current = stay
+                self._since = monotonic_now
+                if stay is not None:
+                    self._totals(self._games, game_type)[1] += 1
+                    self._totals(self._locations, stay)[1] += 1
+
+    def get_stats(self, limit: int = None) -> dict:
+        """
+        Returns the time spent per game and per location, longest first.
+
+        The stay in the current location is counted up to now.
+        """
+        with self._lock:
+            games = {game: list(totals) for game, totals in self._games.items()}
+            locations = {stay: list(totals) for stay, totals in self._locations.items()}
+            current = self._current
+            if current is not None:
+                elapsed = time.monotonic() - self._since
+                self._totals(games, current[0])[0] += elapsed
+                self._totals(locations, current)[0] += elapsed
+            recent = list(self._recent)
+
+        locations = sorted(locations.items(), key=lambda item: item[1][0], reverse=True)
+        return {
+            'current': {'game_type': current[0], 'location': current[1]} if current else None,
+            'games': [
+                {'game_type': game, 'seconds': round(seconds, 1), 'visits': visits}
+                for game, (seconds, visits) in sorted(games.items(), key=lambda item: item[1][0], reverse=True)
+            ],
+            'locations': [
+                {'game_type': game, 'location': location, 'seconds': round(seconds, 1), 'visits': visits}
+                for (game, location), (seconds, visits) in locations[:limit]
+            ],
+            'recent': [
+                {'time': timestamp, 'game_type': game, 'location': location, 'players_online': online, 'players_on_map': on_map}
+                for timestamp, game, location, online, on_map in reversed(recent)
+            ]
+        }
+
+    def flush(self):
+        """Appends the buffered records to the log and saves the totals, rotating the log if it would grow too large."""
+        with self._write_lock:
+            with self._lock:
+                # Saving the time of the ongoing stay too loses at most one interval on a crash
+                self._close_stay(time.monotonic())
+                buffer, self._buffer = self._buffer, bytearray()
+                dirty, self._dirty = self._dirty, False
+                stats = {
+                    'games': [[game, *totals] for game, totals in self._games.items()],
+                    'locations': [[*stay, *totals] for stay, totals in self._locations.items()]
+                }
+            if not dirty:
+                return
+
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                if buffer:
+                    self._append(buffer)
+                self._save_stats(stats)
+            except OSError as e:
+                exceptions_total.inc('session_log')
+                print(f"Error writing session log: {e}")
+
+    def load_stats(self):
+        """Loads the totals saved by a previous session, if any."""
+        try:
+            with open(os.path.join(self.directory, STATS_FILE), 'r', encoding='utf-8') as file:
+                stats = json.load(file)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Error loading session stats: {e}")
+            return
+
+        with self._lock:
+            self._games = {game: [seconds, visits] for game, seconds, visits in stats.get('games', [])}
+            self._locations = {(game, location): [seconds, visits] for game, location, seconds, visits in stats.get('locations', [])}
+
+    def _close_stay(self, now: float):
+        """Adds the time spent in the current location to the totals. Must hold the lock."""
+        if self._current is None:
+            return
+        elapsed = now - self._since
+        self._totals(self._games, self._current[0])[0] += elapsed
+        self._totals(self._locations, self._current)[0] += elapsed
+        self._since = now
+        self._dirty = True
+
+    @staticmethod
+    def _totals(table: dict, key) -> list:
+        totals = table.get(key)
+        if totals is None:
+            totals = table[key] = [0.0, 0]
+        return totals
+
+    def _append(self, buffer: bytes):
+        """Writes whole records to the log, rotating whenever the next ones would not fit."""
+        path = os.path.join(self.directory, LOG_FILE)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        position = 0
+        while position < len(buffer):
+            if size and size + RECORD_LENGTH.unpack_from(buffer, position)[0] > self.max_bytes:
+                self._rotate()
+                size = 0
+            room = self.max_bytes - max(size, len(MAGIC))
+            end = position
+            while end < len(buffer):
+                length = RECORD_LENGTH.unpack_from(buffer, end)[0]
+                # A file always takes at least one record, however small the limit
+                if end > position and end + length - position > room:
+                    break
+                end += length
+
+            with open(path, 'ab') as file:
+                if size == 0:
+                    file.write(MAGIC)
+                    size = len(MAGIC)
+                file.write(buffer[position:end])
+            size += end - position
+            position = end
+
+    def _rotate(self):
+        """Shifts session.log to session.1.log and so on, dropping the oldest file."""
+        base, extension = os.path.splitext(LOG_FILE)
+        names = [LOG_FILE] + [f"{base}.{index}{extension}" for index in range(1, self.max_files + 1)]
+        oldest = os.path.join(self.directory, names[-1])
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for index in range(len(names) - 2, -1, -1):
+            source = os.path.join(self.directory, names[index])
+            if os.path.exists(source):
+                os.replace(source, os.path.join(self.directory, names[index + 1]))
+
+    def _save_stats(self, stats: dict):
+        path = os.path.join(self.directory, STATS_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(stats, file)
+        os.replace(path + '.tmp', path)
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+def read_session_log(path: str):
+    """
+    Yields (time, game type, location, players online, players on map) from a log file.
+
+    A record cut short by a crash ends the iteration.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a session log")
+
+    position = len(MAGIC)
+    while position + RECORD.size <= len(data):
+        length, timestamp, online, on_map, game_length, location_length = RECORD.unpack_from(data, position)
+        if length < RECORD.size or position + length > len(data):
+            return
+        start = position + RECORD.size
+        game_type = data[start:start + game_length].decode('utf-8', 'replace')
+        location = data[start + game_length:start + game_length + location_length].decode('utf-8', 'replace')
+        yield timestamp, game_type, location, online, on_map
+        position += length
+
+session_log = SessionLog()
+
+def get_session_stats(limit: int = None) -> dict:
+    """Global function to retrieve the time spent per game and per location."""
+    return session_log.get_stats(limit)
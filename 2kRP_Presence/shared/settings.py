@@ -0,0 +1,95 @@
+import threading
+from typing import NamedTuple
+
+class PresenceSettings(NamedTuple):
+    """Immutable snapshot of the presence preferences, stored under 'presence/<field>'."""
+    details: str
+    state: str
+    large_image: str
+    small_image: str
+    large_image_text: str
+    small_image_text: str
+    large_image_url: str
+    small_image_url: str
+
+DEFAULT_PRESENCE_SETTINGS = PresenceSettings(
+    details='Playing {gametype}',
+    state='In: {location}',
+    large_image='use_current_room',
+    small_image='use_badge',
+    large_image_text='{playersonline} players online and {playersonmap} on the current map',
+    small_image_text='  ',
+    large_image_url='https://i.imgur.com/TN8WK7E.png',
+    small_image_url='https://i.imgur.com/TN8WK7E.png'
+)
+
+def open_settings():
+    """
+    Opens the application QSettings.
+
+    Only QtCore is imported, so this works without a QApplication or any widgets.
+    """
+    from PySide6.QtCore import QSettings
+    QSettings.setDefaultFormat(QSettings.IniFormat)
+    return QSettings("2kRP", "2kRP_Presence_Controller")
+
+def settings_key(field: str) -> str:
+    """Returns the QSettings key of a presence settings field."""
+    return f"presence/{field}"
+
+def read_presence_settings(settings) -> PresenceSettings:
+    """Builds a snapshot from a QSettings object, using the defaults for missing keys."""
+    return PresenceSettings(*(
+        settings.value(settings_key(field), default, type=str)
+        for field, default in zip(PresenceSettings._fields, DEFAULT_PRESENCE_SETTINGS)
+    ))
+
+def write_default_presence_settings(settings):
+    """Stores the default value of every presence settings field that is not set yet."""
+    for field, default in zip(PresenceSettings._fields, DEFAULT_PRESENCE_SETTINGS):
+        if not settings.contains(settings_key(field)):
+            settings.setValue(settings_key(field), default)
+
+class SettingsStore:
+    """
+    Holds the current presence settings snapshot.
+
+    Snapshots are replaced as a whole, so readers on other threads always see a consistent
+    set of values without touching QSettings.
+    """
+    def __init__(self):
+        self._snapshot = DEFAULT_PRESENCE_SETTINGS
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """Registers a callback to be called with the new snapshot whenever it changes."""
+        self._listeners.append(callback)
+
+    def publish(self, snapshot: PresenceSettings):
+        """Replaces the current snapshot and notifies the listeners if it changed."""
+        with self._lock:
+            changed = snapshot != self._snapshot
+            self._snapshot = snapshot
+
+        if changed:
+            for callback in self._listeners:
+                callback(snapshot)
+
+    def get(self) -> PresenceSettings:
+        """Returns the current snapshot."""
+        return self._snapshot
+
+settings_store = SettingsStore()
+
+def publish_presence_settings(snapshot: PresenceSettings):
+    """Global function to publish a new settings snapshot."""
+    settings_store.publish(snapshot)
+
+def get_presence_settings() -> PresenceSettings:
+    """Global function to retrieve the current settings snapshot."""
+    return settings_store.get()
+
+def subscribe_presence_settings(callback):
+    """Global function to listen for settings changes."""
+    settings_store.subscribe(callback)
@@ -6,8 +6,93 @@ app_data = {
 BASE_WIKI_URL = 'https://yume.wiki'
 DEFAULT_LANGUAGE = 'en'
 
+# Game IDs used in the YNOproject URLs and wiki paths, with their display names
+game_type_mappings = {
+    '2kki': 'Yume 2kki',
+    'amillusion': 'Amillusion',
+    'braingirl': 'Braingirl',
+    'deepdreams': 'Deep Dreams',
+    'flow': '.flow',
+    'fog': 'Fog',
+    'genie': 'Dream Genie',
+    'if': 'If',
+    'mikan': 'Mikan Muzou',
+    'muma': 'Muma Rope',
+    'nostalgic': 'nostAlgic',
+    'oneshot': 'Oneshot',
+    'oversomnia': 'Oversomnia',
+    'prayers': 'Answered Prayers',
+    'sheawaits': 'She Awaits',
+    'someday': 'Someday',
+    'tsushin': 'Yume Tsushin',
+    'unaccomplished': 'Unaccomplished',
+    'unconscious': 'Collective Unconscious',
+    'ultraviolet': 'Ultra Violet',
+    'unevendream': 'Uneven Dream',
+    'yume': 'Yume Nikki'
+}
+
+# Local server
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 7789
+SERVER_BACKENDS = ('asyncio', 'flask')
+
+# Wiki image cache
+IMAGE_CACHE_FILE = 'cache/wiki_images.json'
+IMAGE_CACHE_MAX_ENTRIES = 512
+IMAGE_CACHE_TTL = 6 * 60 * 60
+
+# Seconds a presence update may wait for the room image before the texts go out without it
+PRESENCE_IMAGE_BUDGET = 0.25
+
+# Stylesheets rendered by qt_material, one directory per theme variant
+STYLESHEET_CACHE_DIR = 'cache/stylesheets'
+
+# Session history, rotated into SESSION_LOG_MAX_FILES older files
+SESSION_LOG_DIR = 'history'
+SESSION_LOG_MAX_BYTES = 256 * 1024
+SESSION_LOG_MAX_FILES = 4
+SESSION_LOG_FLUSH_INTERVAL = 10
+
+# Offline room image index, built with 'python -m utils.image_index build'
+IMAGE_INDEX_FILE = 'data/wiki_image_index.bin'
+
+# Shared HTTP client
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_READ_TIMEOUT = 10
+HTTP_POOL_HOSTS = 4
+HTTP_POOL_MAX_PER_HOST = 2
+HTTP_DRAIN_LIMIT = 256 * 1024
+
+# Wiki prefetcher, kept below HTTP_POOL_MAX_PER_HOST so room lookups always get a connection
+PREFETCH_MAX_WORKERS = 1
+PREFETCH_REQUESTS_PER_MINUTE = 12
+PREFETCH_MAX_LINKS = 8
+# Pages resolved per request when the wiki API is available
+PREFETCH_BATCH_SIZE = 24
+
+# MediaWiki API of each wiki, relative to the wiki root ('https://yume.wiki/2kki'). Up to
+# WIKI_API_BATCH_SIZE titles are resolved per request; a wiki whose API fails is only
+# asked again after WIKI_API_RETRY_INTERVAL seconds, the HTML pages serving meanwhile
+WIKI_API_ENABLED = True
+WIKI_API_PATH = 'api.php'
+WIKI_API_BATCH_SIZE = 50
+WIKI_API_RETRY_INTERVAL = 600
+
+# Wiki worker processes fetching and parsing pages; 0 parses in-process. A worker using
+# more than WIKI_WORKER_MEMORY_LIMIT KiB is replaced after its current request
+WIKI_WORKER_PROCESSES = 2
+WIKI_WORKER_MEMORY_LIMIT = 96 * 1024
+WIKI_WORKER_TIMEOUT = 30
+
+# Memory diagnostics; one traced frame is enough to group allocations by module
+MEMORY_TRACE_FRAMES = 1
+MEMORY_TOP_MODULES = 15
+# Without new game data for this long, low-memory mode drops caches and idle connections
+LOW_MEMORY_IDLE_SECONDS = 300
+
 def get_app_name():
     return app_data['app_name']
 
 def get_app_version():
-    return app_data['app_version']
\ No newline at end of file
+    return app_data['app_version']
@@ -0,0 +1,123 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from utils.constants import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_DRAIN_LIMIT,
+    HTTP_POOL_HOSTS,
+    HTTP_POOL_MAX_PER_HOST,
+    get_app_name,
+    get_app_version,
+)
+from utils.memory import add_memory_releaser
+
+try:
+    import brotli  # noqa: F401 - lets urllib3 decode 'br' responses
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTP adapter that applies the default connect/read timeouts to every request."""
+    def __init__(self, timeout, *args, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+_session = None
+_session_lock = threading.Lock()
+
+def create_session() -> requests.Session:
+    """
+    Creates a session with a keep-alive connection pool shared by all outbound requests.
+
+    Each host gets its own pool of at most HTTP_POOL_MAX_PER_HOST connections; extra requests
+    wait for a free connection instead of opening new ones.
+    """
+    session = requests.Session()
+    adapter = TimeoutHTTPAdapter(
+        timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+        pool_connections=HTTP_POOL_HOSTS,
+        pool_maxsize=HTTP_POOL_MAX_PER_HOST,
+        pool_block=True
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({
+        'User-Agent': f"{get_app_name()}/{get_app_version()}",
+        'Accept-Encoding': ACCEPT_ENCODING
+    })
+    return session
+
+def get_session() -> requests.Session:
+    """Returns the shared HTTP session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+def close_session():
+    """Closes the shared session and its idle connections; the next request opens a new one."""
+    global _session
+    with _session_lock:
+        session, _session = _session, None
+    if session is not None:
+        session.close()
+
+add_memory_releaser(close_session)
+
+def get(url: str, **kwargs) -> requests.Response:
+    """Sends a GET request through the shared session."""
+    return get_session().get(url, **kwargs)
+
+def release(response: requests.Response, chunks=None):
+    """
+    Finishes a streamed response early.
+
+    Up to HTTP_DRAIN_LIMIT bytes of unread body are drained so the connection can return to
+    the pool; larger leftovers are discarded by closing the connection instead.
+    """
+    if chunks is None:
+        chunks = response.iter_content(chunk_size=16 * 1024)
+
+    drained = 0
+    try:
+        for chunk in chunks:
+            drained += len(chunk)
+            if drained > HTTP_DRAIN_LIMIT:
+                break
+    except requests.RequestException:
+        pass
+    response.close()
+
+def get_pool_stats() -> dict:
+    """
+    Returns connection reuse statistics for every host the shared session talked to.
+
+    Returns:
+        dict: Maps 'scheme://host:port' to its number of requests, opened connections
+        and requests that reused an already open connection.
+    """
+    if _session is None:
+        return {}
+
+    stats = {}
+    for adapter in set(_session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                'requests': pool.num_requests,
+                'connections': pool.num_connections,
+                'reused': max(pool.num_requests - pool.num_connections, 0)
+            }
+    return stats
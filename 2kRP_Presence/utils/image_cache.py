@@ -0,0 +1,194 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from utils.constants import (
+    IMAGE_CACHE_FILE,
+    IMAGE_CACHE_MAX_ENTRIES,
+    IMAGE_CACHE_TTL,
+)
+from utils.metrics import metrics
+
+class ImageCache:
+    """
+    Persistent LRU cache of resolved wiki room images.
+
+    Entries are keyed by the wiki page URL and keep the resolved image URL together with
+    the page's ETag/Last-Modified validators, so stale entries can be revalidated with a
+    conditional GET instead of downloading and parsing the page again.
+    """
+    def __init__(self, file_path: str, max_entries: int = IMAGE_CACHE_MAX_ENTRIES, ttl: float = IMAGE_CACHE_TTL):
+        self.file_path = file_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'revalidations': 0,
+            'evictions': 0
+        }
+        self.load()
+
+    def load(self):
+        """Loads the cache entries from disk, if the cache file exists."""
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as file:
+                entries = json.load(file)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Error loading image cache: {e}")
+            return
+
+        with self._lock:
+            self._entries = OrderedDict((key, entry) for key, entry in entries if isinstance(entry, dict))
+            self._evict()
+
+    def save(self):
+        """Writes the cache entries to disk, replacing the previous file atomically."""
+        with self._lock:
+            entries = list(self._entries.items())
+
+        try:
+            directory = os.path.dirname(self.file_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = self.file_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(entries, file)
+            os.replace(temp_path, self.file_path)
+        except OSError as e:
+            print(f"Error saving image cache: {e}")
+
+    def get_fresh(self, key: str):
+        """
+        Returns the cache entry for the given key if it has not expired yet.
+
+        Returns:
+            dict: The cache entry if it is still fresh, otherwise None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['expires_at'] <= time.time():
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry
+
+    def is_fresh(self, key: str) -> bool:
+        """Tells whether the key has an unexpired entry, without counting a hit."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry['expires_at'] > time.time()
+
+    def get_stale(self, key: str):
+        """Returns the cache entry for the given key even if it has expired, or None."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def get_validators(self, key: str) -> dict:
+        """Returns the conditional request headers for the given key."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return {}
+
+            headers = {}
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+            return headers
+
+    def revalidate(self, key: str):
+        """
+        Marks an entry as still valid after a '304 Not Modified' response.
+
+        Returns:
+            dict: The refreshed cache entry, or None if it was evicted meanwhile.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry['expires_at'] = time.time() + self.ttl
+            self._entries.move_to_end(key)
+            self._stats['revalidations'] += 1
+
+        self.save()
+        return entry
+
+    def store(self, key: str, image_url: str, etag: str = None, last_modified: str = None, links: list = None):
+        """Stores a freshly resolved image URL along with the page validators and the pages it links to."""
+        with self._lock:
+            self._put(key, image_url, etag, last_modified, links)
+            self._evict()
+
+        self.save()
+
+    def store_many(self, images: dict):
+        """Stores several images resolved at once, given as {key: (image_url, links)}, saving the file once. None links keep the known ones."""
+        with self._lock:
+            for key, (image_url, links) in images.items():
+                self._put(key, image_url, links=links)
+            self._evict()
+
+        self.save()
+
+    def clear(self):
+        """Removes every entry from the cache."""
+        with self._lock:
+            self._entries.clear()
+
+        self.save()
+
+    def stats(self) -> dict:
+        """Returns the cache hit/miss counters and its current size."""
+        with self._lock:
+            return {
+                **self._stats,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries
+            }
+
+    def _put(self, key: str, image_url: str, etag: str = None, last_modified: str = None, links: list = None):
+        """Adds or replaces an entry, keeping the links of the previous one when 'links' is None. Must hold the lock."""
+        if links is None:
+            links = (self._entries.get(key) or {}).get('links')
+        self._entries[key] = {
+            'image_url': image_url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'links': links,
+            'expires_at': time.time() + self.ttl
+        }
+        self._entries.move_to_end(key)
+        self._stats['misses'] += 1
+
+    def _evict(self):
+        """Drops the least recently used entries above the size bound. Must hold the lock."""
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+image_cache = ImageCache(IMAGE_CACHE_FILE)
+
+def collect_image_cache_metrics():
+    """Reports the image cache statistics to the metrics registry."""
+    stats = image_cache.stats()
+    return [
+        ('presence_image_cache_hits_total', 'counter', 'Image lookups answered from a fresh cache entry.', stats['hits']),
+        ('presence_image_cache_misses_total', 'counter', 'Images that had to be resolved from a full wiki page.', stats['misses']),
+        ('presence_image_cache_revalidations_total', 'counter', 'Expired entries confirmed by a 304 response.', stats['revalidations']),
+        ('presence_image_cache_evictions_total', 'counter', 'Entries dropped to respect the size bound.', stats['evictions']),
+        ('presence_image_cache_entries', 'gauge', 'Entries currently cached.', stats['entries'])
+    ]
+
+metrics.add_collector(collect_image_cache_metrics)
+
+def get_image_cache_stats():
+    """Global function to retrieve the image cache statistics."""
+    return image_cache.stats()
@@ -0,0 +1,272 @@
+"""
+Offline index of wiki room images, shipped as a memory-mapped file.
+
+The index maps wiki page paths ('/2kki/Urban_Street') and game locations ('2kki' +
+'Urban Street') to the room image URL, so well-known rooms are resolved without touching
+the network. Lookups are a binary search over the mapped file; nothing but the matched
+image URL is turned into Python objects.
+
+File layout, all integers little-endian:
+    header   MAGIC, key count, offset of the values table
+    offsets  one uint32 per key, the position of its record, sorted by key
+    records  uint16 key length, uint32 value position, UTF-8 key
+    values   uint16 length, UTF-8 image URL; shared by every key of the same image
+
+Build it from a directory of saved wiki pages (from the 2kRP_Presence directory):
+    python -m utils.image_index build PAGES_DIR [--output FILE] [--game GAME_ID]
+    python -m utils.image_index lookup URL_OR_PATH [--game GAME_ID --location NAME]
+"""
+import argparse
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+from urllib.parse import unquote, urlsplit
+from utils.constants import IMAGE_INDEX_FILE, game_type_mappings
+from utils.metrics import metrics
+
+MAGIC = b'2KRPIMG1'
+HEADER = struct.Struct('<8sII')
+OFFSET = struct.Struct('<I')
+RECORD = struct.Struct('<HI')
+VALUE = struct.Struct('<H')
+
+index_lookups = metrics.counter('presence_image_index_lookups_total', 'Room image lookups in the offline index, by result.', ('result',))
+
+def page_key(wiki_url: str) -> str:
+    """Returns the index key of a wiki page URL or path, e.g. 'page:/2kki/urban_street'."""
+    path = unquote(urlsplit(wiki_url).path).replace(' ', '_').rstrip('/')
+    return 'page:' + path.casefold()
+
+def location_key(game_type: str, location: str) -> str:
+    """Returns the index key of a location name in a game, e.g. 'location:2kki/urban street'."""
+    return f"location:{game_type}/{' '.join(location.replace('_', ' ').split()).casefold()}"
+
+class ImageIndex:
+    """
+    Read-only view of an image index file.
+
+    The file is mapped on the first lookup. A missing or invalid file leaves the index
+    empty, so every lookup misses and the caller falls back to fetching the page.
+    """
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._map = None
+        self._count = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def lookup(self, wiki_url: str = None, game_type: str = None, location: str = None):
+        """
+        Returns the image of a room by its wiki page, or by its location name when the page is unknown.
+
+        Returns:
+            str: The image URL, or None if the room is not in the index.
+        """
+        image_url = None
+        if wiki_url:
+            image_url = self.get(page_key(wiki_url))
+        if image_url is None and game_type and location:
+            image_url = self.get(location_key(game_type, location))
+        index_lookups.inc('hit' if image_url is not None else 'miss')
+        return image_url
+
+    def contains_page(self, wiki_url: str) -> bool:
+        """Tells whether a wiki page is in the index, without counting a lookup."""
+        return bool(wiki_url) and self.get(page_key(wiki_url)) is not None
+
+    def get(self, key: str):
+        """Binary searches the index for an exact key. Returns the image URL or None."""
+        if not self._loaded:
+            self._open()
+        data = self._map
+        if data is None:
+            return None
+
+        target = key.encode('utf-8')
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            record, = OFFSET.unpack_from(data, HEADER.size + middle * OFFSET.size)
+            key_length, value_position = RECORD.unpack_from(data, record)
+            start = record + RECORD.size
+            candidate = data[start:start + key_length]
+            if candidate < target:
+                low = middle + 1
+            elif candidate > target:
+                high = middle
+            else:
+                value_length, = VALUE.unpack_from(data, value_position)
+                start = value_position + VALUE.size
+                return data[start:start + value_length].decode('utf-8')
+        return None
+
+    def __len__(self):
+        if not self._loaded:
+            self._open()
+        return self._count
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+            self._map = None
+            self._count = 0
+            self._loaded = False
+
+    def _open(self):
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            try:
+                with open(self.file_path, 'rb') as file:
+                    data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except FileNotFoundError:
+                return
+            except (OSError, ValueError) as e:
+                print(f"Error opening image index: {e}")
+                return
+
+            magic, count, _ = HEADER.unpack_from(data) if len(data) >= HEADER.size else (None, 0, 0)
+            if magic != MAGIC or HEADER.size + count * OFFSET.size > len(data):
+                print(f"Error opening image index: {self.file_path} is not an image index")
+                data.close()
+                return
+            self._map = data
+            self._count = count
+
+def write_index(entries: dict, file_path: str):
+    """
+    Writes an index file from a {key: image_url} dict, replacing the previous file atomically.
+
+    Keys are sorted by their UTF-8 bytes, which is the order get() searches in.
+    """
+    keys = sorted((key.encode('utf-8'), image_url) for key, image_url in entries.items())
+
+    values = bytearray()
+    value_positions = {}
+    records = bytearray()
+    record_positions = []
+    records_start = HEADER.size + len(keys) * OFFSET.size
+    values_start = records_start + sum(RECORD.size + len(key) for key, _ in keys)
+
+    for key, image_url in keys:
+        if image_url not in value_positions:
+            encoded = image_url.encode('utf-8')
+            value_positions[image_url] = values_start + len(values)
+            values += VALUE.pack(len(encoded)) + encoded
+        record_positions.append(records_start + len(records))
+        records += RECORD.pack(len(key), value_positions[image_url]) + key
+
+    directory = os.path.dirname(file_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = file_path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, len(keys), values_start))
+        for position in record_positions:
+            file.write(OFFSET.pack(position))
+        file.write(records)
+        file.write(values)
+    os.replace(temp_path, file_path)
+
+PAGE_NAME_PATTERN = re.compile(rb'"wgPageName"\s*:\s*"((?:[^"\\]|\\.)*)"')
+CATEGORIES_PATTERN = re.compile(rb'"wgCategories"\s*:\s*\[([^\]]*)\]')
+# MediaWiki declares the page name and categories in the head, well before the content
+PAGE_HEAD_BYTES = 64 * 1024
+
+def read_page_metadata(content: bytes):
+    """Returns (page name, categories) from the mw.config block of a saved wiki page."""
+    head = content[:PAGE_HEAD_BYTES]
+    name = PAGE_NAME_PATTERN.search(head)
+    categories = CATEGORIES_PATTERN.search(head)
+    page_name = json.loads(b'"' + name.group(1) + b'"') if name else None
+    category_names = json.loads(b'[' + categories.group(1) + b']') if categories else []
+    return page_name, category_names
+
+def detect_game_type(path: str, categories: list, default: str = None):
+    """Finds the game of a saved page from its categories, then from its parent directory name."""
+    games_by_name = {name.casefold(): game_type for game_type, name in game_type_mappings.items()}
+    for category in categories:
+        game_type = games_by_name.get(category.casefold())
+        if game_type:
+            return game_type
+    directory = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    return directory if directory in game_type_mappings else default
+
+def build_index(pages_dir: str, file_path: str = IMAGE_INDEX_FILE, default_game: str = None) -> dict:
+    """
+    Builds the index from a directory of saved wiki pages (.html, searched recursively).
+
+    Every page with a room image is indexed by its wiki path and by its location name.
+
+    Returns:
+        dict: Counts of indexed, skipped and failed pages.
+    """
+    from utils.wiki_extractor import extract_image_url_from_html
+
+    entries = {}
+    summary = {'indexed': 0, 'no_image': 0, 'no_game': 0, 'errors': 0}
+    for root, _, files in os.walk(pages_dir):
+        for name in sorted(files):
+            if not name.lower().endswith(('.html', '.htm')):
+                continue
+            path = os.path.join(root, name)
+            try:
+                with open(path, 'rb') as file:
+                    content = file.read()
+                page_name, categories = read_page_metadata(content)
+                image_url = extract_image_url_from_html(content)
+            except Exception as e:
+                print(f"Error indexing {path}: {e}")
+                summary['errors'] += 1
+                continue
+
+            game_type = detect_game_type(path, categories, default_game)
+            if game_type is None:
+                summary['no_game'] += 1
+                continue
+            if not image_url:
+                summary['no_image'] += 1
+                continue
+
+            page_name = page_name or os.path.splitext(name)[0]
+            entries[page_key(f"/{game_type}/{page_name}")] = image_url
+            entries.setdefault(location_key(game_type, page_name), image_url)
+            summary['indexed'] += 1
+
+    write_index(entries, file_path)
+    summary['keys'] = len(entries)
+    return summary
+
+image_index = ImageIndex(IMAGE_INDEX_FILE)
+
+def lookup_room_image(wiki_url: str = None, game_type: str = None, location: str = None):
+    """Global function to look a room image up in the offline index."""
+    return image_index.lookup(wiki_url, game_type, location)
+
+def main():
+    parser = argparse.ArgumentParser(description='Builds or queries the offline wiki image index.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='index a directory of saved wiki pages')
+    build.add_argument('pages_dir')
+    build.add_argument('--output', default=IMAGE_INDEX_FILE)
+    build.add_argument('--game', choices=sorted(game_type_mappings), help='game of the pages whose game cannot be detected')
+    lookup = commands.add_parser('lookup', help='look a room up in an index file')
+    lookup.add_argument('wiki_url', nargs='?')
+    lookup.add_argument('--index', default=IMAGE_INDEX_FILE)
+    lookup.add_argument('--game')
+    lookup.add_argument('--location')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        summary = build_index(args.pages_dir, args.output, args.game)
+        print(', '.join(f"{count} {name.replace('_', ' ')}" for name, count in summary.items()))
+    else:
+        print(ImageIndex(args.index).lookup(args.wiki_url, args.game, args.location))
+
+if __name__ == '__main__':
+    main()
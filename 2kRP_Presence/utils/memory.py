@@ -0,0 +1,199 @@
+import ctypes
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from utils.constants import LOW_MEMORY_IDLE_SECONDS, MEMORY_TOP_MODULES, MEMORY_TRACE_FRAMES
+
+def read_rss_kib() -> int:
+    """Returns the resident set size of this process in KiB, or 0 where it cannot be read."""
+    return _read_memory_counters()[0]
+
+def read_peak_rss_kib() -> int:
+    """Returns the highest resident set size this process reached in KiB, or 0 where it cannot be read."""
+    return _read_memory_counters()[1]
+
+def _read_memory_counters():
+    if sys.platform.startswith('linux'):
+        counters = {}
+        try:
+            with open('/proc/self/status', 'r', encoding='utf-8') as file:
+                for line in file:
+                    if line.startswith(('VmRSS:', 'VmHWM:')):
+                        counters[line[:5]] = int(line.split()[1])
+        except OSError:
+            pass
+        return counters.get('VmRSS', 0), counters.get('VmHWM', 0)
+
+    if sys.platform == 'win32':
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [(name, ctypes.c_size_t) for name in (
+                'cb', 'PageFaultCount', 'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage',
+                'QuotaPagedPoolUsage', 'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage'
+            )]
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        try:
+            process = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize // 1024, counters.PeakWorkingSetSize // 1024
+        except (AttributeError, OSError):
+            pass
+        return 0, 0
+
+    try:
+        import resource
+        # Only the peak is available; macOS reports it in bytes
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return 0, peak // 1024 if sys.platform == 'darwin' else peak
+    except ImportError:
+        return 0, 0
+
+class MemoryDiagnostics:
+    """
+    Reports where the memory of the process goes.
+
+    Allocation tracing is off until the first snapshot is requested, since tracemalloc slows
+    every allocation down. Each snapshot reports the largest allocation sites grouped by
+    module, and how they changed since the previous snapshot and since the first one.
+    Tracing then stays on, so later snapshots can show growth, until a snapshot is taken
+    with 'stop' set: GET /memory?stop=1, or the stop button of the tray report.
+
+    Modules holding caches register a releaser; in low-memory mode the releasers run after
+    LOW_MEMORY_IDLE_SECONDS without new game data, followed by a garbage collection.
+    """
+    def __init__(self, frames: int = MEMORY_TRACE_FRAMES, top: int = MEMORY_TOP_MODULES):
+        self.frames = frames
+        self.top = top
+        self._baseline = None
+        self._previous = None
+        self._traced_since = None
+        self._releasers = []
+        self._module_names = {}
+        self._activity = threading.Event()
+        self._lock = threading.Lock()
+
+    def snapshot(self, stop: bool = False) -> dict:
+        """Takes an allocation snapshot, starting the tracing on first use, and reports it. Stops the tracing afterwards if 'stop' is set."""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                self._traced_since = time.time()
+                self._baseline = self._previous = None
+
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            ))
+            traced, traced_peak = tracemalloc.get_traced_memory()
+            report = {
+                'rss_kib': read_rss_kib(),
+                'peak_rss_kib': read_peak_rss_kib(),
+                'traced_kib': traced // 1024,
+                'traced_peak_kib': traced_peak // 1024,
+                'traced_since': self._traced_since,
+                'top_modules': self._group(snapshot.statistics('filename')),
+                'since_previous': self._group(snapshot.compare_to(self._previous, 'filename'), diff=True) if self._previous else [],
+                'since_first': self._group(snapshot.compare_to(self._baseline, 'filename'), diff=True) if self._baseline else []
+            }
+            if stop:
+                self._stop_tracing()
+                return report
+            if self._baseline is None:
+                self._baseline = snapshot
+            self._previous = snapshot
+            return report
+
+    def stop_tracing(self):
+        """Stops the allocation tracing and drops the kept snapshots."""
+        with self._lock:
+            self._stop_tracing()
+
+    def _stop_tracing(self):
+        tracemalloc.stop()
+        self._baseline = self._previous = self._traced_since = None
+
+    def add_releaser(self, callback):
+        """Registers a callback dropping memory that can be rebuilt on demand, such as caches and idle connections."""
+        self._releasers.append(callback)
+
+    def release_memory(self):
+        """Runs every releaser, collects garbage and hands the freed heap back to the system where possible."""
+        for callback in self._releasers:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error releasing memory: {e}")
+        gc.collect()
+        if sys.platform.startswith('linux'):
+            try:
+                ctypes.CDLL('libc.so.6').malloc_trim(0)
+            except (OSError, AttributeError):
+                pass
+
+    def notify_activity(self, *args):
+        """Data listener for low-memory mode: postpones the next release. Accepts and ignores any listener arguments."""
+        self._activity.set()
+
+    def start_idle_release(self, stop_flag, idle_seconds: float = LOW_MEMORY_IDLE_SECONDS):
+        """Releases memory once after every period of 'idle_seconds' without activity, until 'stop_flag' is set."""
+        def watch():
+            released = False
+            while not stop_flag.is_set():
+                if self._activity.wait(idle_seconds):
+                    self._activity.clear()
+                    released = False
+                elif not released and not stop_flag.is_set():
+                    self.release_memory()
+                    released = True
+        threading.Thread(target=watch, name='memory-release', daemon=True).start()
+
+    def _group(self, statistics, diff: bool = False) -> list:
+        """Sums per-file statistics by module, largest (or most changed) first."""
+        modules = {}
+        for stat in statistics:
+            module = self._module_name(stat.traceback[0].filename)
+            totals = modules.setdefault(module, [0, 0])
+            totals[0] += stat.size_diff if diff else stat.size
+            totals[1] += stat.count_diff if diff else stat.count
+
+        ranked = sorted(modules.items(), key=lambda item: abs(item[1][0]), reverse=True)
+        size_key, count_key = ('size_diff_kib', 'count_diff') if diff else ('size_kib', 'count')
+        return [
+            {'module': module, size_key: round(size / 1024, 1), count_key: count}
+            for module, (size, count) in ranked[:self.top] if size or not diff
+        ]
+
+    def _module_name(self, filename: str) -> str:
+        """Turns a source file path into a dotted module name using the import path."""
+        name = self._module_names.get(filename)
+        if name is not None:
+            return name
+
+        name = filename
+        path = os.path.abspath(filename)
+        for entry in sorted((os.path.abspath(entry or '.') for entry in sys.path), key=len, reverse=True):
+            if path.startswith(entry + os.sep):
+                relative = os.path.splitext(path[len(entry) + 1:])[0]
+                name = relative.replace(os.sep, '.').removesuffix('.__init__')
+                break
+        self._module_names[filename] = name
+        return name
+
+memory_diagnostics = MemoryDiagnostics()
+
+def take_memory_snapshot(stop: bool = False) -> dict:
+    """Global function to take an allocation snapshot and report it, optionally stopping the tracing."""
+    return memory_diagnostics.snapshot(stop)
+
+def stop_memory_tracing():
+    """Global function to stop the allocation tracing started by the first snapshot."""
+    memory_diagnostics.stop_tracing()
+
+def add_memory_releaser(callback):
+    """Global function to register a callback that drops rebuildable memory."""
+    memory_diagnostics.add_releaser(callback)
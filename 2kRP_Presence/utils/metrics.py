@@ -0,0 +1,154 @@
+import bisect
+import threading
+
+# Upper bounds in seconds, from a cached lookup up to a slow wiki page
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    """Formats label pairs as '{name="value",...}', or an empty string without labels."""
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter, optionally split by label values."""
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in sorted(values):
+            yield self.name, format_labels(self.labels, label_values), value
+
+class Histogram:
+    """
+    Distribution of observed values over fixed buckets, optionally split by label values.
+
+    Only the per-bucket counts are stored; the cumulative counts Prometheus expects are
+    computed when the metrics are rendered.
+    """
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                # One slot per bucket, one for +Inf, then the sum of all observations
+                counts = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def count(self, *label_values) -> int:
+        counts = self._values.get(label_values)
+        return sum(counts[:-1]) if counts else 0
+
+    def samples(self):
+        with self._lock:
+            values = [(label_values, list(counts)) for label_values, counts in self._values.items()]
+        for label_values, counts in sorted(values):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", format_labels(self.labels, label_values, f'le="{format_value(bound)}"'), cumulative
+            yield f"{self.name}_sum", format_labels(self.labels, label_values), counts[-1]
+            yield f"{self.name}_count", format_labels(self.labels, label_values), cumulative
+
+class MetricsRegistry:
+    """
+    Collects the application metrics and renders them in the Prometheus text format.
+
+    Counters and histograms are updated where things happen. Values that other objects
+    already track, such as the image cache statistics, are read by collector callbacks
+    only when the metrics are rendered, so they cost nothing on the hot path.
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labels: tuple = ()) -> Counter:
+        """Returns the counter with the given name, creating it on first use."""
+        return self._register(Counter, name, documentation, labels)
+
+    def histogram(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        """Returns the histogram with the given name, creating it on first use."""
+        return self._register(Histogram, name, documentation, labels, buckets)
+
+    def add_collector(self, callback):
+        """
+        Registers a callback returning extra metrics at render time.
+
+        The callback returns (name, type, documentation, value) tuples.
+        """
+        self._collectors.append(callback)
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {format_value(value)}")
+
+        for callback in self._collectors:
+            try:
+                collected = callback()
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+                continue
+            for name, metric_type, documentation, value in collected:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                lines.append(f"{name} {format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def _register(self, metric_class, name, documentation, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, documentation, *args)
+            return metric
+
+metrics = MetricsRegistry()
+
+# Failures by the place they were caught at, shared by every module
+exceptions_total = metrics.counter('presence_exceptions_total', 'Exceptions caught, by site.', ('site',))
+
+def render_metrics() -> str:
+    """Global function to render the metrics in the Prometheus text format."""
+    return metrics.render()
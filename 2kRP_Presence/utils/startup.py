@@ -0,0 +1,49 @@
+import sys
+import threading
+import time
+
+class StartupTimer:
+    """
+    Records how long each startup phase took, from the first import of this module until
+    the first presence update reaches Discord.
+
+    Phases are marked in order with 'mark'; each one is timed from the previous mark. When
+    enabled, the breakdown is printed once, on 'finish'.
+    """
+    def __init__(self):
+        self.enabled = False
+        self._start = time.perf_counter()
+        self._last = self._start
+        self._phases = []
+        self._reported = False
+        self._lock = threading.Lock()
+
+    def mark(self, phase: str):
+        """Ends the current phase under the given name."""
+        with self._lock:
+            now = time.perf_counter()
+            self._phases.append((phase, now - self._last))
+            self._last = now
+
+    def finish(self, phase: str):
+        """Marks the last phase and prints the report if enabled. Later calls do nothing."""
+        with self._lock:
+            if self._reported:
+                return
+            self._reported = True
+        self.mark(phase)
+        if self.enabled:
+            print(self.format_report())
+
+    def format_report(self) -> str:
+        """Returns the phase breakdown as a table."""
+        lines = [f"{'phase':<20}{'ms':>10}"]
+        for phase, duration in self._phases:
+            lines.append(f"{phase:<20}{duration * 1000:>10.1f}")
+        lines.append(f"{'total':<20}{(self._last - self._start) * 1000:>10.1f}")
+
+        heavy = [name for name in ('PySide6', 'qt_material', 'flask', 'requests', 'bs4') if name in sys.modules]
+        lines.append(f"loaded: {', '.join(heavy) or '-'}")
+        return '\n'.join(lines)
+
+startup_timer = StartupTimer()
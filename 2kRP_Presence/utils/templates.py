@@ -0,0 +1,110 @@
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from utils.memory import add_memory_releaser
+
+PLACEHOLDER_PATTERN = re.compile(r'\{([^}]+)\}')
+
+class CompiledTemplate:
+    """
+    A template split once into literal parts and placeholders.
+
+    'parts' holds (literal, placeholder) pairs, where 'placeholder' is None for the trailing
+    literal; 'fields' lists the distinct placeholder names in order of appearance.
+    """
+    __slots__ = ('text', 'parts', 'fields')
+
+    def __init__(self, text: str):
+        parts = []
+        fields = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            parts.append((text[position:match.start()], match.group(1)))
+            if match.group(1) not in fields:
+                fields.append(match.group(1))
+            position = match.end()
+        parts.append((text[position:], None))
+
+        self.text = text
+        self.parts = tuple(parts)
+        self.fields = tuple(fields)
+
+    def render(self, values: dict) -> str:
+        """Fills the placeholders from 'values', leaving unknown ones untouched."""
+        output = []
+        for literal, field in self.parts:
+            output.append(literal)
+            if field is not None:
+                output.append(str(values[field]) if field in values else '{' + field + '}')
+        return ''.join(output)
+
+@lru_cache(maxsize=64)
+def compile_template(text: str) -> CompiledTemplate:
+    """Compiles a template, reusing the previous result for an unchanged text."""
+    return CompiledTemplate(text)
+
+add_memory_releaser(compile_template.cache_clear)
+
+class TemplateRenderer:
+    """
+    Renders templates whose placeholders are resolved lazily from a set of inputs.
+
+    Each placeholder is declared as name -> (input names, resolver). A placeholder is only
+    resolved when the template uses it, and the rendered output is memoized on the template,
+    the given context and the values of the inputs the template actually references.
+    """
+    def __init__(self, placeholders: dict, memo_size: int = 128):
+        self.placeholders = placeholders
+        self.memo_size = memo_size
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """Forgets every memoized output."""
+        with self._lock:
+            self._memo.clear()
+
+    def find_unknown(self, text: str) -> list:
+        """Returns the placeholders used in 'text' that this renderer does not know."""
+        return [field for field in compile_template(text).fields if field not in self.placeholders]
+
+    def render(self, text: str, inputs: dict, context: tuple = ()) -> str:
+        """
+        Renders 'text' with the given inputs.
+
+        Args:
+            text (str): The template text.
+            inputs (dict): Raw input values the placeholder resolvers read from.
+            context (tuple): Extra values the output depends on, such as the language code.
+
+        Returns:
+            str: The rendered text.
+        """
+        template = compile_template(text)
+        referenced = []
+        for field in template.fields:
+            placeholder = self.placeholders.get(field)
+            if placeholder is not None:
+                referenced.extend(inputs.get(name) for name in placeholder[0])
+        key = (text, context, tuple(referenced))
+
+        with self._lock:
+            output = self._memo.get(key)
+            if output is not None:
+                self._memo.move_to_end(key)
+                return output
+
+        values = {}
+        for field in template.fields:
+            placeholder = self.placeholders.get(field)
+            if placeholder is not None:
+                input_names, resolver = placeholder
+                values[field] = resolver(*(inputs.get(name) for name in input_names))
+        output = template.render(values)
+
+        with self._lock:
+            self._memo[key] = output
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return output
@@ -0,0 +1,125 @@
+import glob
+import json
+import os
+import threading
+from utils.constants import DEFAULT_LANGUAGE
+
+LANGS_DIR = 'langs'
+LANGUAGE_FILE = 'language.txt'
+# Catalog entry holding the plural rule of a language instead of a translated string
+PLURAL_RULE_KEY = '_plural'
+DEFAULT_PLURAL_RULE = {'singular_max': 1, 'suffix': 's'}
+
+class Translator:
+    """
+    In-memory translation catalog.
+
+    Every 'langs/*.json' file is loaded once and merged over the default language, so a
+    lookup is a single dict access. The active language is kept as one immutable tuple that
+    is swapped atomically when the language changes.
+    """
+    def __init__(self, langs_dir: str = LANGS_DIR, language_file: str = LANGUAGE_FILE):
+        self.langs_dir = langs_dir
+        self.language_file = language_file
+        self._catalogs = {}
+        self._plural_rules = {}
+        self._active = None
+        self._language_mtime = None
+        self._watcher = None
+        self._stop_watching = threading.Event()
+        self.load()
+
+    def load(self):
+        """Loads every language file and activates the language stored in the language file."""
+        raw = {}
+        for path in glob.glob(os.path.join(self.langs_dir, '*.json')):
+            code = os.path.splitext(os.path.basename(path))[0]
+            try:
+                with open(path, 'r', encoding='utf-8') as file:
+                    raw[code] = json.load(file)
+            except Exception as e:
+                print(f"Error loading JSON file: {e}")
+
+        default = raw.get(DEFAULT_LANGUAGE, {})
+        default_rule = default.get(PLURAL_RULE_KEY, DEFAULT_PLURAL_RULE)
+        catalogs = {}
+        plural_rules = {}
+        for code, strings in raw.items():
+            merged = {**default, **strings}
+            rule = {**DEFAULT_PLURAL_RULE, **default_rule, **merged.pop(PLURAL_RULE_KEY, {})}
+            catalogs[code] = merged
+            plural_rules[code] = (rule['singular_max'], rule['suffix'])
+
+        self._catalogs = catalogs
+        self._plural_rules = plural_rules
+        self._activate(self._read_language_file())
+
+    def get_language(self) -> str:
+        """Returns the active language code."""
+        return self._active[0]
+
+    def get(self, key: str) -> str:
+        """Returns the translated string for the given key in the active language."""
+        translation = self._active[1].get(key)
+        if translation is None:
+            return f"'{key}' not found in '{DEFAULT_LANGUAGE}'"
+        return translation
+
+    def plural_suffix(self, count: int) -> str:
+        """Returns the plural suffix for the given count in the active language."""
+        singular_max, suffix = self._active[2]
+        return '' if count <= singular_max else suffix
+
+    def set_language(self, language_code: str):
+        """Activates a language and stores it in the language file."""
+        try:
+            with open(self.language_file, 'w', encoding='utf-8') as file:
+                file.write(language_code)
+            self._language_mtime = os.stat(self.language_file).st_mtime_ns
+        except OSError as e:
+            print(f"Error saving language file: {e}")
+        self._activate(language_code)
+
+    def start_watching(self, interval: float = 2):
+        """Starts a background thread that activates the language file's code whenever the file changes."""
+        if self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name='language-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        """Stops the language file watcher."""
+        self._stop_watching.set()
+
+    def _watch(self, interval):
+        while not self._stop_watching.wait(interval):
+            try:
+                mtime = os.stat(self.language_file).st_mtime_ns
+            except OSError:
+                continue
+            if mtime != self._language_mtime:
+                self._activate(self._read_language_file())
+
+    def _read_language_file(self) -> str:
+        try:
+            with open(self.language_file, 'r', encoding='utf-8') as file:
+                language = file.read().strip()
+            self._language_mtime = os.stat(self.language_file).st_mtime_ns
+        except OSError:
+            return DEFAULT_LANGUAGE
+        return language or DEFAULT_LANGUAGE
+
+    def _activate(self, language_code: str):
+        catalog = self._catalogs.get(language_code, self._catalogs.get(DEFAULT_LANGUAGE, {}))
+        plural_rule = self._plural_rules.get(language_code, self._plural_rules.get(DEFAULT_LANGUAGE, (1, 's')))
+        self._active = (language_code, catalog, plural_rule)
+
+translator = Translator()
+
+def get_language_code() -> str:
+    """Global function to retrieve the active language code."""
+    return translator.get_language()
+
+def set_language_code(language_code: str):
+    """Global function to switch the active language."""
+    translator.set_language(language_code)
@@ -1,13 +1,15 @@
 import json
 import re
-import requests
-from bs4 import BeautifulSoup
-from utils.constants import (
-    BASE_WIKI_URL,
-    DEFAULT_LANGUAGE,
-)
+import time
+from utils.constants import BASE_WIKI_URL, WIKI_API_ENABLED
+from utils.image_cache import image_cache
+from utils.wiki_api import resolve_with_api
+from utils.wiki_worker import fetch_page
+from utils.translations import translator
+from utils.templates import compile_template
+from utils.metrics import exceptions_total, metrics
 
-_translation_cache = {}
+wiki_fetch_seconds = metrics.histogram('presence_wiki_fetch_seconds', 'Time spent fetching wiki pages, by result.', ('result',))
 
 def load_json(file_path: str):
     """Loads a JSON file and returns its content as a dictionary."""
@@ -31,11 +33,7 @@ def replace_patterns(text: str, replacements: dict) -> str:
     Returns:
         str: The string with all patterns replaced.
     """
-    def replacer(match):
-        key = match.group(1)
-        return str(replacements.get(key, match.group(0)))
-
-    return re.sub(r'\{([^}]+)\}', replacer, text)
+    return compile_template(text).render(replacements)
 
 def validate_url(url: str):
     """Validates if the provided URL is valid."""
@@ -49,28 +47,9 @@ def validate_url(url: str):
 
     return bool(url_pattern.match(url))
 
-def load_translation(language_code):
-    return load_json(f"langs/{language_code}.json")
-
 def get_translated_string(key: str):
     """Retrieves the translated string for the given key based on the current language setting."""
-    with open('language.txt', 'r', encoding='utf-8') as file:
-        language = file.read().strip()
-    
-    if language not in _translation_cache:
-        _translation_cache[language] = load_translation(language)
-    
-    translations = _translation_cache[language]
-    if key in translations:
-        return translations[key]
-    
-    if DEFAULT_LANGUAGE != language:
-        if DEFAULT_LANGUAGE not in _translation_cache:
-            _translation_cache[DEFAULT_LANGUAGE] = load_translation(DEFAULT_LANGUAGE)
-        default_translations = _translation_cache[DEFAULT_LANGUAGE]
-        return default_translations.get(key, f"'{key}' not found in '{DEFAULT_LANGUAGE}'")
-    
-    return f"'{key}' not found in '{language}'"
+    return translator.get(key)
 
 def get_image_link(soup, selector):
     """Extracts the image link from the soup object using the provided selector."""
@@ -81,24 +60,12 @@ def get_image_link(soup, selector):
             return BASE_WIKI_URL + thumbborder['src']
     return img_link['href'] if img_link else None
 
-def get_wiki_image(wiki_url: str):
+def extract_image_url(soup):
     """
-    Tries to get the current room image from yume.wiki website.
+    Extracts the room image URL from a parsed wiki page, or None if there is none.
     
-    Returns:
-        str: The URL of the image if found, otherwise None.
+    This is the reference selector chain; utils.wiki_extractor follows the same rules without building a tree.
     """
-    if not wiki_url:
-        return None
-
-    try:
-        response = requests.get(wiki_url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-    except requests.RequestException as e:
-        print(f"Error getting wiki page: {e}")
-        return None
-
     selectors = [
         '#tab-content-facts-list > div > div > div.smw-table.smwfacttable > div:nth-child(2) > div.smw-table-cell.smwprops > a',
         '#tab-content-facts-list > div > div > div.smw-table.smwfacttable > div:nth-child(3) > div.smw-table-cell.smwprops > a',
@@ -110,4 +77,92 @@ def get_wiki_image(wiki_url: str):
         if image_url:
             return BASE_WIKI_URL + image_url if image_url.startswith('/') else image_url
 
-    return None
\ No newline at end of file
+    return None
+
+def get_wiki_image(wiki_url: str):
+    """
+    Tries to get the current room image from yume.wiki website.
+    
+    Resolved images are kept in the persistent image cache, and fresh entries are returned
+    without touching the network. Otherwise the wiki API is asked first, which answers with
+    a few hundred bytes of JSON; the HTML page is only fetched when the API has no image.
+    
+    Returns:
+        str: The URL of the image if found, otherwise None.
+    """
+    if not wiki_url:
+        return None
+
+    cached = image_cache.get_fresh(wiki_url)
+    if cached is not None:
+        return cached['image_url']
+    return get_wiki_images([wiki_url]).get(wiki_url)
+
+def get_wiki_images(wiki_urls: list, fallback: bool = True) -> dict:
+    """
+    Resolves the room images of several wiki pages, asking the wiki API about all of them at once.
+    
+    The API does not know the room connections, so pages it resolves keep the infobox links
+    of their previous cache entry, or have none until their HTML page is read.
+    
+    Args:
+        wiki_urls (list): The wiki page URLs.
+        fallback (bool): Fetch the HTML page of every page the API could not resolve.
+    
+    Returns:
+        dict: Maps each page to its image URL or None. Pages left unresolved without fallback are omitted.
+    """
+    images = {}
+    pending = []
+    for wiki_url in dict.fromkeys(filter(None, wiki_urls)):
+        cached = image_cache.get_fresh(wiki_url)
+        if cached is not None:
+            images[wiki_url] = cached['image_url']
+        else:
+            pending.append(wiki_url)
+
+    if pending and WIKI_API_ENABLED:
+        start = time.perf_counter()
+        resolved = resolve_with_api(pending)
+        if resolved:
+            wiki_fetch_seconds.observe(time.perf_counter() - start, 'api')
+            image_cache.store_many(resolved)
+            images.update((wiki_url, image_url) for wiki_url, (image_url, _) in resolved.items())
+
+    if fallback:
+        for wiki_url in pending:
+            if wiki_url not in images:
+                images[wiki_url] = get_wiki_image_from_page(wiki_url)
+    return images
+
+def get_wiki_image_from_page(wiki_url: str):
+    """
+    Gets a room image from the HTML page of the wiki, bypassing the fresh cache entries.
+    
+    Expired entries are revalidated with a conditional GET, so an unchanged page costs a
+    '304 Not Modified' instead of a full download and parse. Pages are fetched and parsed
+    by a worker process (see utils.wiki_worker), incrementally and only until the image
+    and the infobox links, which the prefetcher uses, are found.
+    
+    Returns:
+        str: The URL of the image if found, otherwise None.
+    """
+    start = time.perf_counter()
+    # Fetched and parsed in a worker process, so parsing never holds the GIL of this one
+    page = fetch_page(wiki_url, image_cache.get_validators(wiki_url))
+    if page['status'] == 'not_modified':
+        revalidated = image_cache.revalidate(wiki_url)
+        if revalidated is not None:
+            wiki_fetch_seconds.observe(time.perf_counter() - start, 'not_modified')
+            return revalidated['image_url']
+        page = fetch_page(wiki_url)
+    if page['status'] != 'fetched':
+        wiki_fetch_seconds.observe(time.perf_counter() - start, 'error')
+        exceptions_total.inc('wiki_fetch')
+        print(f"Error getting wiki page: {page.get('message')}")
+        stale = image_cache.get_stale(wiki_url)
+        return stale['image_url'] if stale else None
+
+    wiki_fetch_seconds.observe(time.perf_counter() - start, 'fetched')
+    image_cache.store(wiki_url, page['image_url'], page['etag'], page['last_modified'], page['links'])
+    return page['image_url']
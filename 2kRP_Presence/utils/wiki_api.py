@@ -0,0 +1,168 @@
+"""
+Room image lookups through the MediaWiki API of the wiki.
+
+One api.php request (action=query, prop=pageimages) returns the lead image of up to
+WIKI_API_BATCH_SIZE pages as compact JSON, instead of downloading and parsing every page.
+Like the HTML pages, the queries run in the wiki worker processes. Pages the API has no
+image for, and every page of a wiki whose API fails, are left to the HTML extractor.
+
+The API only resolves images. Its 'links' property lists every link of a page in
+alphabetical order, not the connections of the room, so those are still read from the
+infobox of the HTML page.
+"""
+import threading
+import time
+from urllib.parse import quote, unquote, urlsplit
+from utils.constants import WIKI_API_BATCH_SIZE, WIKI_API_ENABLED, WIKI_API_PATH, WIKI_API_RETRY_INTERVAL
+from utils.metrics import metrics
+
+# Characters MediaWiki leaves unescaped in page URLs
+TITLE_SAFE_CHARACTERS = "/:;@$!*(),~'"
+
+api_requests = metrics.counter('presence_wiki_api_requests_total', 'MediaWiki API queries, by result.', ('result',))
+api_pages = metrics.counter('presence_wiki_api_pages_total', 'Pages looked up through the MediaWiki API, by result.', ('result',))
+
+def split_wiki_url(wiki_url: str):
+    """
+    Splits a wiki page URL into its wiki root and page title.
+
+    Returns:
+        tuple: ('https://yume.wiki/2kki', 'Urban Street') for 'https://yume.wiki/2kki/Urban_Street',
+        or None if the URL is not a page of a wiki.
+    """
+    parts = urlsplit(wiki_url)
+    segments = parts.path.strip('/').split('/', 1)
+    if not parts.scheme or not parts.netloc or len(segments) < 2 or not segments[1]:
+        return None
+    return f"{parts.scheme}://{parts.netloc}/{segments[0]}", unquote(segments[1]).replace('_', ' ')
+
+def build_page_url(wiki_root: str, title: str) -> str:
+    """Returns the URL of a page title, the inverse of split_wiki_url."""
+    return f"{wiki_root}/{quote(title.replace(' ', '_'), safe=TITLE_SAFE_CHARACTERS)}"
+
+def query_page_images(wiki_root: str, titles: list) -> dict:
+    """
+    Asks the wiki API for the lead image of every title, following normalization and redirects.
+
+    Returns:
+        dict: Maps each title the API knows about to {'image_url', 'missing'}.
+
+    Raises:
+        requests.RequestException: If the request fails.
+        ValueError: If the answer is not a pageimages query result.
+    """
+    from utils import http_client
+
+    params = {
+        'action': 'query',
+        'format': 'json',
+        'formatversion': '2',
+        'redirects': '1',
+        'prop': 'pageimages',
+        'piprop': 'original',
+        'pilimit': 'max',
+        'titles': '|'.join(titles)
+    }
+
+    response = http_client.get(f"{wiki_root}/{WIKI_API_PATH}", params=params)
+    response.raise_for_status()
+    data = response.json()
+    if 'error' in data:
+        raise ValueError(data['error'].get('info') or data['error'].get('code'))
+    # Wikis without the PageImages extension answer with a warning and no images at all
+    if 'pageimages' in str(data.get('warnings', {}).get('main', '')):
+        raise ValueError("The wiki API does not support pageimages")
+
+    query = data.get('query') or {}
+    aliases = {alias['from']: alias['to'] for alias in query.get('normalized', []) + query.get('redirects', [])}
+    pages = {page.get('title'): page for page in query.get('pages', [])}
+
+    results = {}
+    for title in titles:
+        target, seen = title, set()
+        while target in aliases and target not in seen:
+            seen.add(target)
+            target = aliases[target]
+        page = pages.get(target)
+        if page is None:
+            continue
+        if page.get('missing') or page.get('invalid'):
+            results[title] = {'image_url': None, 'missing': True}
+            continue
+        results[title] = {'image_url': (page.get('original') or {}).get('source'), 'missing': False}
+    return results
+
+class WikiApiClient:
+    """
+    Resolves room images of many wiki pages with as few API requests as possible.
+
+    Pages are grouped by wiki and sent in batches of 'batch_size' titles. A wiki whose API
+    fails is skipped for 'retry_interval' seconds, so a wiki without a usable API does not
+    cost an extra request before every HTML fallback.
+    """
+    def __init__(self, batch_size: int = WIKI_API_BATCH_SIZE, retry_interval: float = WIKI_API_RETRY_INTERVAL):
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self._unavailable = {}
+        self._lock = threading.Lock()
+
+    def is_available(self, wiki_url: str) -> bool:
+        """Tells whether the API of the wiki hosting a page may be asked right now."""
+        if not WIKI_API_ENABLED:
+            return False
+        split = split_wiki_url(wiki_url) if wiki_url else None
+        return split is not None and self._is_root_available(split[0])
+
+    def resolve(self, wiki_urls: list) -> dict:
+        """
+        Looks the given pages up through the API.
+
+        Returns:
+            dict: Maps every page the API answered to (image URL or None, None), the links
+            being unknown. Pages missing from the result need the HTML fallback.
+        """
+        from utils.wiki_worker import query_images
+
+        batches = {}
+        for wiki_url in wiki_urls:
+            split = split_wiki_url(wiki_url)
+            if split is not None and self.is_available(wiki_url):
+                batches.setdefault(split[0], []).append((split[1], wiki_url))
+
+        resolved = {}
+        for wiki_root, pages in batches.items():
+            for start in range(0, len(pages), self.batch_size):
+                batch = pages[start:start + self.batch_size]
+                reply = query_images(wiki_root, [title for title, _ in batch])
+                if reply['status'] != 'fetched':
+                    api_requests.inc('error')
+                    print(f"Error querying wiki API: {reply.get('message')}")
+                    with self._lock:
+                        self._unavailable[wiki_root] = time.monotonic() + self.retry_interval
+                    break
+
+                api_requests.inc('ok')
+                for title, wiki_url in batch:
+                    page = reply['pages'].get(title)
+                    if page is None or not (page['image_url'] or page['missing']):
+                        api_pages.inc('fallback')
+                        continue
+                    api_pages.inc('missing' if page['missing'] else 'image')
+                    resolved[wiki_url] = (page['image_url'], None)
+        return resolved
+
+    def _is_root_available(self, wiki_root: str) -> bool:
+        with self._lock:
+            retry_at = self._unavailable.get(wiki_root)
+            if retry_at is None:
+                return True
+            if time.monotonic() < retry_at:
+                return False
+            del self._unavailable[wiki_root]
+            return True
+
+wiki_api = WikiApiClient()
+
+def resolve_with_api(wiki_urls: list) -> dict:
+    """Global function to look room images up through the wiki API."""
+    return wiki_api.resolve(wiki_urls)
@@ -0,0 +1,242 @@
+import codecs
+from html.parser import HTMLParser
+from utils.constants import BASE_WIKI_URL
+
+# Elements html.parser based BeautifulSoup trees close immediately
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem',
+    'meta', 'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame',
+    'image', 'isindex', 'nextid', 'spacer'
+}
+
+# Infobox links kept per page; navigation tables can link hundreds of pages
+MAX_LINKS = 16
+
+FACTS_LIST_ID = 'tab-content-facts-list'
+CONTENT_TEXT_ID = 'mw-content-text'
+
+class _StopParsing(Exception):
+    pass
+
+class _Element:
+    __slots__ = ('tag', 'id', 'classes', 'index', 'children')
+
+    def __init__(self, tag, attrs, index):
+        self.tag = tag
+        self.id = attrs.get('id')
+        self.classes = (attrs.get('class') or '').split()
+        self.index = index
+        self.children = 0
+
+class WikiImageExtractor(HTMLParser):
+    """
+    Incremental extractor for the room image of a yume.wiki page.
+
+    It follows the same selector chain as utils.utils.extract_image_url, but only keeps the
+    stack of open elements instead of building a whole BeautifulSoup tree, and stops parsing
+    as soon as the result can no longer change. Element ids are assumed to be unique, so a
+    selector anchored on an id is settled once that element is closed.
+
+    With 'collect_links', the wiki pages linked from the infobox (the first
+    '#mw-content-text > div > table') are gathered too, which are the connected locations
+    on room pages; parsing then also goes on until that table is closed.
+    """
+    def __init__(self, collect_links: bool = False):
+        super().__init__(convert_charrefs=True)
+        self.collect_links = collect_links
+        self.links = []
+        self._infobox = None
+        self._infobox_closed = not collect_links
+        self._stack = [_Element('[document]', {}, 0)]
+        self._open_counts = {}
+        self._facts_link = [None, None]
+        self._infobox_image = None
+        self._thumbborder = None
+        self._facts_closed = False
+        self._content_closed = False
+        self.finished = False
+        self.result = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict((key, value if value is not None else '') for key, value in attrs)
+        parent = self._stack[-1]
+        parent.children += 1
+        element = _Element(tag, attrs, parent.children)
+
+        if tag == 'a':
+            if self._facts_link[0] is None or self._facts_link[1] is None:
+                self._match_facts_link(attrs)
+            if self._infobox is not None and not self._infobox_closed:
+                self._add_link(attrs.get('href'))
+        elif tag == 'table' and self._infobox is None and self.collect_links and self._match_infobox(parent):
+            self._infobox = element
+        elif tag == 'img':
+            if self._thumbborder is None and 'thumbborder' in element.classes:
+                self._thumbborder = attrs.get('src', '')
+            if self._infobox_image is None and self._match_infobox_image():
+                self._infobox_image = attrs
+
+        if tag in VOID_ELEMENTS:
+            self._check_done()
+            return
+
+        self._stack.append(element)
+        self._open_counts[tag] = self._open_counts.get(tag, 0) + 1
+        self._check_done()
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if not self._open_counts.get(tag):
+            return
+
+        while len(self._stack) > 1:
+            element = self._stack.pop()
+            self._open_counts[element.tag] -= 1
+            if element.id == FACTS_LIST_ID:
+                self._facts_closed = True
+            elif element.id == CONTENT_TEXT_ID:
+                self._content_closed = True
+                self._infobox_closed = True
+            elif element is self._infobox:
+                self._infobox_closed = True
+            if element.tag == tag:
+                break
+        self._check_done()
+
+    def finish(self):
+        """Marks the end of the document and settles the result."""
+        self.close()
+        self.finished = True
+        self._check_done()
+        return self.result
+
+    def _ancestor(self, depth):
+        """Returns the open element 'depth' levels above the element being started."""
+        return self._stack[-depth] if depth < len(self._stack) else None
+
+    def _match_facts_link(self, attrs):
+        # '#tab-content-facts-list > div > div > div.smw-table.smwfacttable > div:nth-child(N) > div.smw-table-cell.smwprops > a'
+        cell, row, table, inner, outer, facts = (self._ancestor(depth) for depth in range(1, 7))
+        if facts is None or facts.id != FACTS_LIST_ID:
+            return
+        if not (cell.tag == 'div' and 'smw-table-cell' in cell.classes and 'smwprops' in cell.classes):
+            return
+        if not (table.tag == 'div' and 'smw-table' in table.classes and 'smwfacttable' in table.classes):
+            return
+        if row.tag != 'div' or inner.tag != 'div' or outer.tag != 'div' or row.index not in (2, 3):
+            return
+
+        slot = row.index - 2
+        if self._facts_link[slot] is None:
+            self._facts_link[slot] = attrs
+
+    def _match_infobox(self, parent):
+        # '#mw-content-text > div > table'
+        content = self._ancestor(2)
+        return parent.tag == 'div' and content is not None and content.id == CONTENT_TEXT_ID
+
+    def _add_link(self, href):
+        """Keeps links to other wiki pages, skipping files, special pages and anchors."""
+        if not href or not href.startswith('/') or href.startswith('//'):
+            return
+        path = href.split('#', 1)[0]
+        if not path or ':' in path or '?' in path:
+            return
+        url = BASE_WIKI_URL + path
+        if url not in self.links:
+            self.links.append(url)
+            if len(self.links) >= MAX_LINKS:
+                self._infobox_closed = True
+
+    def _match_infobox_image(self):
+        # '#mw-content-text > div > table > tbody > tr:nth-child(2) > td > a > img'
+        link, cell, row, body, table, wrapper, content = (self._ancestor(depth) for depth in range(1, 8))
+        if content is None or content.id != CONTENT_TEXT_ID:
+            return False
+        return (
+            link.tag == 'a' and cell.tag == 'td' and row.tag == 'tr' and row.index == 2
+            and body.tag == 'tbody' and table.tag == 'table' and wrapper.tag == 'div'
+        )
+
+    def _resolve_link(self, attrs):
+        """Mirrors utils.utils.get_image_link. Returns (settled, value)."""
+        href = attrs.get('href')
+        if href is None:
+            return True, None
+        if href.startswith('/File'):
+            if self._thumbborder is not None:
+                return True, BASE_WIKI_URL + self._thumbborder
+            if not self.finished:
+                return False, None
+        return True, href
+
+    def _check_done(self):
+        if not self._infobox_closed and not self.finished:
+            return
+
+        candidates = (
+            (self._facts_link[0], self._facts_closed),
+            (self._facts_link[1], self._facts_closed),
+            (self._infobox_image, self._content_closed),
+        )
+        for attrs, closed in candidates:
+            if attrs is None:
+                if closed or self.finished:
+                    continue
+                return
+
+            settled, value = self._resolve_link(attrs)
+            if not settled:
+                return
+            if value:
+                self.result = BASE_WIKI_URL + value if value.startswith('/') else value
+                raise _StopParsing()
+
+        self.result = None
+        raise _StopParsing()
+
+def extract_page_data_from_chunks(chunks, encoding: str = 'utf-8'):
+    """
+    Extracts the room image URL and the infobox links from an iterable of raw HTML byte chunks.
+
+    Parsing stops at the first chunk after which both are known, so the rest of the iterable
+    is left unconsumed.
+
+    Returns:
+        tuple: (image URL or None, list of linked wiki page URLs).
+    """
+    extractor = WikiImageExtractor(collect_links=True)
+    _parse_chunks(extractor, chunks, encoding)
+    return extractor.result, extractor.links
+
+def extract_image_url_from_chunks(chunks, encoding: str = 'utf-8'):
+    """
+    Extracts the room image URL from an iterable of raw HTML byte chunks.
+
+    Parsing stops at the first chunk after which the result is known, so the rest of the
+    iterable is left unconsumed.
+
+    Returns:
+        str: The URL of the image if found, otherwise None.
+    """
+    extractor = WikiImageExtractor()
+    _parse_chunks(extractor, chunks, encoding)
+    return extractor.result
+
+def _parse_chunks(extractor, chunks, encoding):
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    try:
+        for chunk in chunks:
+            extractor.feed(decoder.decode(chunk))
+        extractor.feed(decoder.decode(b'', final=True))
+        extractor.finish()
+    except _StopParsing:
+        pass
+
+def extract_image_url_from_html(content: bytes, encoding: str = 'utf-8'):
+    """Extracts the room image URL from a complete HTML document."""
+    return extract_image_url_from_chunks((content,), encoding)
@@ -0,0 +1,244 @@
+"""
+Out-of-process wiki page fetching and parsing.
+
+Parsing a wiki page is pure Python and holds the GIL, stalling the Qt and server threads
+while it runs. The pages are therefore fetched and parsed by worker processes, each
+running 'python -m utils.wiki_worker' and answering one JSON line per request:
+
+    request  {"url": ..., "validators": {"If-None-Match": ...}}
+    reply    {"status": "fetched", "image_url": ..., "etag": ..., "last_modified": ..., "links": [...], "rss_kib": ...}
+             {"status": "not_modified", "rss_kib": ...}
+             {"status": "error", "message": ..., "rss_kib": ...}
+
+    request  {"kind": "images", "wiki": ..., "titles": [...]}
+    reply    {"status": "fetched", "pages": {title: {"image_url": ..., "missing": false}}, "rss_kib": ...}
+
+The second kind queries the wiki API (see utils.wiki_api). No HTML ever crosses the pipe.
+A worker that crashes, stops answering or grows past its memory limit is replaced by a
+fresh process on the next request. Frozen builds, and setting WIKI_WORKER_PROCESSES to 0,
+run the same code in-process instead.
+"""
+import json
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+from utils.constants import WIKI_WORKER_MEMORY_LIMIT, WIKI_WORKER_PROCESSES, WIKI_WORKER_TIMEOUT
+from utils.memory import add_memory_releaser, read_rss_kib
+from utils.metrics import metrics
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+worker_restarts = metrics.counter('presence_wiki_worker_restarts_total', 'Wiki worker processes replaced, by reason.', ('reason',))
+
+def get_response_charset(response) -> str:
+    """Returns the charset declared by the response, defaulting to UTF-8 like MediaWiki does."""
+    content_type = response.headers.get('Content-Type', '')
+    if 'charset=' in content_type.lower() and response.encoding:
+        return response.encoding
+    return 'utf-8'
+
+def fetch_wiki_page(wiki_url: str, validators: dict = None) -> dict:
+    """
+    Fetches a wiki page, conditionally when validators are given, and extracts its room image and infobox links.
+
+    Returns:
+        dict: The reply described in the module docstring, without 'rss_kib'.
+    """
+    from requests import RequestException
+    from utils import http_client
+    from utils.wiki_extractor import extract_page_data_from_chunks
+
+    try:
+        response = http_client.get(wiki_url, headers=validators or {}, stream=True)
+        if response.status_code == 304:
+            http_client.release(response)
+            return {'status': 'not_modified'}
+        response.raise_for_status()
+        chunks = response.iter_content(chunk_size=16 * 1024)
+        image_url, links = extract_page_data_from_chunks(chunks, get_response_charset(response))
+        http_client.release(response, chunks)
+    except RequestException as e:
+        return {'status': 'error', 'message': str(e)}
+
+    return {
+        'status': 'fetched',
+        'image_url': image_url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'links': links
+    }
+
+def handle_request(request: dict) -> dict:
+    """Answers one request of the protocol, without 'rss_kib'."""
+    if request.get('kind') == 'images':
+        from requests import RequestException
+        from utils.wiki_api import query_page_images
+        try:
+            return {'status': 'fetched', 'pages': query_page_images(request['wiki'], request['titles'])}
+        except (RequestException, ValueError) as e:
+            return {'status': 'error', 'message': str(e)}
+    return fetch_wiki_page(request['url'], request.get('validators'))
+
+class WorkerProcess:
+    """One worker process, its pipes and the thread collecting its replies."""
+    def __init__(self):
+        self.process = None
+        self._replies = None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'utils.wiki_worker'], cwd=APP_DIR,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, encoding='utf-8', bufsize=1
+        )
+        # Pipes cannot be read with a timeout everywhere, so a thread forwards the replies
+        self._replies = queue.Queue()
+        threading.Thread(target=self._read, args=(self.process.stdout, self._replies), name='wiki-worker-reader', daemon=True).start()
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def request(self, request: dict, timeout: float) -> dict:
+        """Sends one request and waits for its reply. Raises OSError if the process died and TimeoutError if it hung."""
+        self.process.stdin.write(json.dumps(request) + '\n')
+        self.process.stdin.flush()
+        try:
+            reply = self._replies.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No reply within {timeout} seconds")
+        if reply is None:
+            raise OSError(f"Worker exited with code {self.process.wait()}")
+        return reply
+
+    def stop(self):
+        """Asks the worker to exit by closing its input, killing it if it does not."""
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    @staticmethod
+    def _read(stdout, replies):
+        for line in stdout:
+            try:
+                replies.put(json.loads(line))
+            except ValueError:
+                continue
+        replies.put(None)
+
+class WikiWorker:
+    """
+    Pool of supervised worker processes fetching and parsing wiki pages.
+
+    Processes are started on first use. Each request takes an idle process, so at most
+    'processes' pages are fetched at once and other callers wait for a free one.
+    """
+    def __init__(self, processes: int = WIKI_WORKER_PROCESSES, memory_limit: int = WIKI_WORKER_MEMORY_LIMIT, timeout: float = WIKI_WORKER_TIMEOUT):
+        self.memory_limit = memory_limit
+        self.timeout = timeout
+        # A frozen executable cannot run '-m utils.wiki_worker'
+        self.in_process = processes <= 0 or getattr(sys, 'frozen', False)
+        self._idle = queue.Queue()
+        for _ in range(max(processes, 0)):
+            self._idle.put(WorkerProcess())
+        self._closed = False
+
+    def fetch(self, wiki_url: str, validators: dict = None) -> dict:
+        """
+        Fetches and parses a wiki page in a worker process.
+
+        Returns:
+            dict: The reply described in the module docstring, without 'rss_kib'.
+        """
+        return self.call({'url': wiki_url, 'validators': validators or {}})
+
+    def query_images(self, wiki_root: str, titles: list) -> dict:
+        """Queries the lead images of several pages of a wiki through its API, in a worker process."""
+        return self.call({'kind': 'images', 'wiki': wiki_root, 'titles': titles})
+
+    def call(self, request: dict) -> dict:
+        """Sends a request to an idle worker, replacing the worker if it fails."""
+        if self.in_process:
+            return handle_request(request)
+
+        worker = self._idle.get()
+        try:
+            # The pool may have been shut down while waiting for the worker
+            if self._closed:
+                return {'status': 'error', 'message': "Wiki worker pool is shut down"}
+            if not worker.is_alive():
+                if worker.process is not None:
+                    worker_restarts.inc('crash')
+                    worker.stop()
+                worker.start()
+            reply = worker.request(request, self.timeout)
+            if reply.pop('rss_kib', 0) > self.memory_limit:
+                # Stopped after answering, so the next request gets a fresh process
+                worker_restarts.inc('memory')
+                worker.stop()
+            return reply
+        except TimeoutError as e:
+            worker_restarts.inc('timeout')
+            worker.stop()
+            return {'status': 'error', 'message': f"Wiki worker stopped answering: {e}"}
+        except OSError as e:
+            worker_restarts.inc('crash')
+            worker.stop()
+            return {'status': 'error', 'message': f"Wiki worker failed: {e}"}
+        finally:
+            # A worker busy during shutdown is stopped once its request is answered
+            if self._closed:
+                worker.stop()
+            self._idle.put(worker)
+
+    def stop_idle(self):
+        """Stops the processes not serving a request; they start again on demand."""
+        idle = []
+        while True:
+            try:
+                idle.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        for worker in idle:
+            worker.stop()
+            self._idle.put(worker)
+
+    def shutdown(self):
+        """Closes the pool and stops the idle processes; the busy ones stop after their current request."""
+        self._closed = True
+        self.stop_idle()
+
+wiki_worker = WikiWorker()
+add_memory_releaser(wiki_worker.stop_idle)
+
+def fetch_page(wiki_url: str, validators: dict = None) -> dict:
+    """Global function to fetch and parse a wiki page outside the calling process."""
+    return wiki_worker.fetch(wiki_url, validators)
+
+def query_images(wiki_root: str, titles: list) -> dict:
+    """Global function to query the lead images of several wiki pages outside the calling process."""
+    return wiki_worker.query_images(wiki_root, titles)
+
+def main():
+    """Worker process loop: answers one JSON request per input line until the input closes."""
+    # Ctrl+C reaches the whole process group; the parent decides when the worker stops
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # stdout carries the replies, so anything else printed goes to stderr
+    replies, sys.stdout = sys.stdout, sys.stderr
+    for line in sys.stdin:
+        try:
+            reply = handle_request(json.loads(line))
+        except Exception as e:
+            reply = {'status': 'error', 'message': str(e)}
+        reply['rss_kib'] = read_rss_kib()
+        print(json.dumps(reply), file=replies, flush=True)
+
+if __name__ == '__main__':
+    main()